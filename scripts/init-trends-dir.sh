@@ -1,7 +1,7 @@
 #!/bin/bash
 set -e 
 
-cd $PWD/data/trends
+cd ${1:-$PWD/data/trends}
 dir_names=( "0" "1" "2" "3" "4" "5" "6" "7" "8" "9" "10" "11" "12" "13" "14" "15" "16" "17" "complete" )
 
 # snapshots
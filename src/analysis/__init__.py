@@ -1,6 +1,9 @@
+from .benchmark import *
 from .plot_alluvial import *
+from .plot_degree_distro import *
 from .plot_network import *
 from .plot_timeline import *
 from .prepare_data import *
+from .sweep import *
 from .temporal_communities import *
 from .trends import *
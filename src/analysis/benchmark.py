@@ -0,0 +1,141 @@
+import logging
+import os
+import pickle
+import time
+
+import igraph as ig
+
+from utils import (EDGE_DIR, GRAPH_FORMAT, GRAPH_SUFFIXES, MATCHING_DIR,
+                   MATCHING_MEMORY, MATCHING_THRESHOLD, MINHASH_PERMUTATIONS,
+                   SEED, detect_communities, edge_file, graph_name, match,
+                   node_key, temporal_network, time_windows,
+                   warm_start_membership)
+
+from .temporal_communities import snapshot_network
+
+
+def _same_graph(g1: ig.Graph, g2: ig.Graph) -> bool:
+    """
+    Check if two graphs are identical (structure, vertex ids and attributes).
+
+    Parameter:
+    - g1: first graph
+    - g2: second graph
+
+    Return:
+    - identical?
+    """
+
+    if g1.is_directed() != g2.is_directed() or g1.get_edgelist() != g2.get_edgelist():
+        return False
+
+    if sorted(g1.vs.attributes()) != sorted(g2.vs.attributes()) or sorted(g1.es.attributes()) != sorted(g2.es.attributes()):
+        return False
+
+    return all(g1.vs[a] == g2.vs[a] for a in g1.vs.attributes()) and all(g1.es[a] == g2.es[a] for a in g1.es.attributes())
+
+
+def benchmark_ingest():
+    """
+    Compare tuple based and columnar edge list ingest per snapshot.
+    """
+
+    for t in time_windows():
+        f = edge_file(t[0], t[1])
+
+        _start = time.perf_counter()
+        g_tuples = temporal_network(file=f, engine="tuples")
+        duration_tuples = time.perf_counter() - _start
+
+        _start = time.perf_counter()
+        g_columnar = temporal_network(file=f, engine="columnar")
+        duration_columnar = time.perf_counter() - _start
+
+        assert _same_graph(g_tuples, g_columnar), f"Ingest engines disagree for snapshot {t[0]}-{t[1]}."
+
+        result = (f"{t[0]}-{t[1]} | {g_columnar.vcount()} nodes, {g_columnar.ecount()} edges | "
+                  f"tuples: {duration_tuples:.2f}s - columnar: {duration_columnar:.2f}s "
+                  f"-> speedup: {duration_tuples / duration_columnar:.1f}x")
+        print(result)
+        logging.info(result)
+
+
+def benchmark_warm_start():
+    """
+    Compare cold and warm started (from partition of previous snapshot) community detection per snapshot with the
+    configured restarts (ADAPTIVE_RESTARTS), i.e. as run by the pipeline. Warm starts iterate Leiden until convergence.
+    """
+
+    snapshot_files = [f for f in os.listdir(EDGE_DIR) if f.endswith(GRAPH_SUFFIXES[GRAPH_FORMAT]) and "-com" not in f]
+    snapshot_files = sorted(snapshot_files, key=(lambda f: int(f.split("-")[0])), reverse=False)
+
+    previous = None
+    for f in snapshot_files:
+        g = snapshot_network(f)
+
+        cold = {}
+        _start = time.perf_counter()
+        membership = detect_communities(g=g, method="leiden", seed=SEED, stats=cold)
+        duration_cold = time.perf_counter() - _start
+
+        if previous is not None:
+            warm = {}
+            _start = time.perf_counter()
+            detect_communities(g=g, method="leiden", seed=SEED, stats=warm,
+                               initial_membership=warm_start_membership(g, previous))
+            duration_warm = time.perf_counter() - _start
+
+            result = (f"{graph_name(f)} | "
+                      f"cold: {cold['iterations']} iterations ({cold['restarts']} restarts), {duration_cold:.2f}s, "
+                      f"modularity {cold['modularity']:.4f} - "
+                      f"warm: {warm['iterations']} iterations ({warm['restarts']} restarts), {duration_warm:.2f}s, "
+                      f"modularity {warm['modularity']:.4f}")
+            print(result)
+            logging.info(result)
+
+        # warm start of next snapshot from (cold) partition of this snapshot
+        previous = dict(zip(g.vs[node_key(g)], membership))
+
+
+def benchmark_matching():
+    """
+    Compare exact (sparse) and approximate (minhash) temporal matching of the community cores of all snapshots
+    (configured threshold, LSH bands are tuned to it).
+    Recall: share of exact matches that are found by the approximate matching as well.
+    """
+
+    with open(os.path.join(MATCHING_DIR, "temporal-community-cores.pkl"), "rb") as fp:
+        timeseries = pickle.load(fp)
+
+    _start = time.perf_counter()
+    exact = match(timeseries, memory=MATCHING_MEMORY, engine="sparse", score_threshold=MATCHING_THRESHOLD)
+    duration_exact = time.perf_counter() - _start
+
+    _start = time.perf_counter()
+    approximate = match(timeseries, memory=MATCHING_MEMORY, engine="minhash", score_threshold=MATCHING_THRESHOLD,
+                        num_perm=MINHASH_PERMUTATIONS)
+    duration_approximate = time.perf_counter() - _start
+
+    common = len(set(exact.items()) & set(approximate.items()))
+
+    result = (f"{len(timeseries)} snapshots, memory {MATCHING_MEMORY} | "
+              f"exact: {len(exact)} matches, {duration_exact:.2f}s - "
+              f"minhash: {len(approximate)} matches, {duration_approximate:.2f}s "
+              f"-> recall: {common / max(len(exact), 1):.3f}, precision: {common / max(len(approximate), 1):.3f}")
+    print(result)
+    logging.info(result)
+
+
+def benchmark(name: str):
+    """
+    Run benchmark.
+
+    Parameter:
+    - name: name of benchmark (ingest, warm_start or matching)
+    """
+
+    benchmarks = {"ingest": benchmark_ingest, "warm_start": benchmark_warm_start, "matching": benchmark_matching}
+
+    assert name in benchmarks, f"Unknown benchmark: {name}"
+
+    benchmarks[name]()
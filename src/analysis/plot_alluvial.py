@@ -3,15 +3,14 @@ import os
 import pickle
 from typing import List, Tuple
 
-import igraph as ig
 import matplotlib.pyplot as plt
-from tqdm import tqdm
 
-from utils import (EDGE_DIR, NUM_TRENDS, alluvial, num_overlap, time_window,
-                   time_windows, trend_description)
+from utils import (MATCHING_DIR, NUM_TRENDS, alluvial, community_store,
+                   num_overlap, time_window, time_windows, trend_description,
+                   trend_manifest)
 
 
-def get_network_nodes(time_window: Tuple[int], community_id: int) -> List[str]:
+def get_network_nodes(time_window: Tuple[int], community_id: int) -> List[int]:
     """
     Get network nodes given a time window and community id.
 
@@ -20,12 +19,10 @@ def get_network_nodes(time_window: Tuple[int], community_id: int) -> List[str]:
     - community_id: id of community
 
     Return:
-    - list of node labels
+    - list of node ids (hashtag vocabulary)
     """
 
-    _g = ig.Graph.Read_Pickle(os.path.join(EDGE_DIR, f"{time_window[0]}-{time_window[1]}-com-{community_id}.pkl"))
-
-    return [_["name"] for _ in _g.vs]
+    return community_store(time_window).ids(community_id)
 
 
 def plot_alluvial(snapshot_id: int):
@@ -38,30 +35,13 @@ def plot_alluvial(snapshot_id: int):
     """
 
     # temporally matched communities (across snapshots)
-    with open(os.path.join(EDGE_DIR, "matched-communities.pkl"), "rb") as fp:
+    with open(os.path.join(MATCHING_DIR, "matched-communities.pkl"), "rb") as fp:
         # matched communities across snapshots
         # list of dicts with values as tuples (t, i) of time step t and community number i
         matched_communities = pickle.load(fp)
 
-    # find overall trend scores per trend
-    tw = time_windows()
-    trend_scores = []
-    for trend_complete in tqdm(matched_communities, desc="trends"):
-        trend_score_complete = 0
-
-        # trend snapshots
-        # trend_snapshot: tuples (snapshot, community id)
-        for trend_snapshot in sorted(trend_complete, key=(lambda _: _[0])):
-            graph_file = f"{tw[trend_snapshot[0]][0]}-{tw[trend_snapshot[0]][1]}-com-{trend_snapshot[1]}.pkl"
-            g_cur = ig.Graph.Read_Pickle(os.path.join(EDGE_DIR, graph_file))
-
-            # trend score: sum of node occurrences of graph
-            trend_score_complete += sum([n["weight"] for n in g_cur.vs])
-
-        trend_scores.append(trend_score_complete)
-
     # sort trend according to overall popularity
-    _, matched_communities = zip(*sorted(zip(trend_scores, matched_communities), reverse=True))
+    matched_communities = [matched_communities[i] for i in trend_manifest()["ranking"]]
 
     # trend descriptions
     descriptions = []
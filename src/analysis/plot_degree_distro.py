@@ -0,0 +1,24 @@
+import json
+import os
+
+import numpy as np
+from tqdm import tqdm
+
+from utils import plot_degree_fit
+
+
+def plot_degree_distro():
+    """
+    Plot degree distributions of snapshots from stored degree histograms and fits (see DEGREE_FIT in config).
+    """
+
+    directory = "figures/degree-distro"
+    files = sorted([f for f in os.listdir(directory) if f.endswith(".json")])
+
+    for f in tqdm(files, desc="snapshots"):
+        with open(os.path.join(directory, f)) as fp:
+            res = json.load(fp)
+
+        degrees = np.repeat(res["histogram"]["degree"], res["histogram"]["count"])
+        plot_degree_fit(degrees, alpha=res["fit"]["alpha"], median=res["fit"]["median"],
+                        file=os.path.join(directory, f.split(".json")[0] + ".png"))
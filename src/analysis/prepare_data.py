@@ -1,13 +1,56 @@
 import os
 
-from utils import EDGE_DIR, temporal_network, time_windows
+from utils import (EDGE_DIR, GRAPH_FORMAT, INGEST_ENGINE, NUM_WORKERS,
+                   artifact_key, build_occurrence_index, edge_file, graph_file,
+                   is_cached, mark_cached, parallel_map, pruned_network,
+                   temporal_network, time_windows, vocabulary_origin,
+                   write_graph)
 
 
-def prepare_data():
+def prepare_snapshot(t: tuple[int]) -> str:
     """
-    For each snapshot create network.
+    Create network of snapshot.
+
+    Parameter:
+    - t: time window of snapshot as unix time stamp tuple
+
+    Return:
+    - file of stored network
+    """
+
+    f = os.path.join(EDGE_DIR, f"{t[0]}-{t[1]}")
+
+    # columnar networks store node ids of the vocabulary of the occurrence index (valid as long as it is extended)
+    key = artifact_key("prepare", [edge_file(t[0], t[1])],
+                       values={"vocabulary": vocabulary_origin() if GRAPH_FORMAT == "columnar" else None})
+    if is_cached(graph_file(f), key):
+        return graph_file(f)
+
+    if INGEST_ENGINE == "pruned":
+        tn = pruned_network(file=edge_file(t[0], t[1]),
+                            figure=os.path.join("figures/degree-distro", f"{t[0]}-{t[1]}.png"))
+    else:
+        tn = temporal_network(file=edge_file(t[0], t[1]), engine=INGEST_ENGINE)
+
+    file = write_graph(tn, f)
+    mark_cached(file, key)
+
+    return file
+
+
+def prepare_data(workers: int = NUM_WORKERS, incremental: bool = False):
     """
-    for t in time_windows():
-        f = os.path.join(EDGE_DIR, f"{t[0]}-{t[1]}")
-        tn = temporal_network(file=(f + ".csv"))
-        tn.write_pickle((f + ".pkl"))
+    Index node occurrences and for each snapshot create network.
+
+    Parameter:
+    - workers: number of snapshots processed in parallel
+    - incremental: only index snapshots not in the index yet and only create networks of snapshots without network
+      (otherwise networks are created if not up to date)
+    """
+    build_occurrence_index(incremental=incremental)
+
+    windows = time_windows()
+    if incremental:
+        windows = [t for t in windows if not os.path.exists(graph_file(os.path.join(EDGE_DIR, f"{t[0]}-{t[1]}")))]
+
+    parallel_map(prepare_snapshot, windows, workers=workers, desc="snapshots")
@@ -0,0 +1,98 @@
+import itertools
+import json
+import os
+import subprocess
+import sys
+
+from utils import (COMMUNITY_DIR, LEIDEN_RESOLUTION, NUM_WORKERS, SWEEP_DIR,
+                   atomic_open, parallel_map)
+
+from .prepare_data import prepare_data
+
+# settings that can be swept (community detection only depends on the resolution)
+SWEEP_PARAMETERS = ["LEIDEN_RESOLUTION", "COMMUNITY_CORE_SIZE", "MATCHING_MEMORY", "MATCHING_THRESHOLD", "NUM_TRENDS"]
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+def run_stages(run: tuple[dict, list[str], str]):
+    """
+    Run analysis tasks in a separate process with overridden config values (on top of the ones set by the caller via
+    TRENDS_CONFIG).
+
+    Parameter:
+    - run: config values (setting -> value), command line arguments of main.py and file for error output of the process
+    """
+
+    overrides, args, stderr_file = run
+    env = dict(os.environ, TRENDS_CONFIG=json.dumps(dict(json.loads(os.environ.get("TRENDS_CONFIG", "{}")),
+                                                         **overrides)))
+    with open(stderr_file, "w") as fp:
+        result = subprocess.run([sys.executable, MAIN] + args, env=env, stdout=subprocess.DEVNULL, stderr=fp)
+
+    if result.returncode != 0:
+        raise Exception(f"Running {' '.join(args)} with {overrides} failed, see {stderr_file}")
+
+
+def community_dir(resolution: float) -> str:
+    """
+    Directory of networks with communities detected with a given resolution.
+
+    Parameter:
+    - resolution: resolution parameter of Leiden
+
+    Return:
+    - directory (default directory for the configured resolution)
+    """
+
+    if resolution == LEIDEN_RESOLUTION:
+        return COMMUNITY_DIR
+
+    return os.path.join(SWEEP_DIR, f"leiden_resolution={resolution}")
+
+
+def sweep(grid: str, workers: int = NUM_WORKERS):
+    """
+    Run temporal matching and trend extraction for all combinations of settings, each in its own output directory
+    (inside SWEEP_DIR). Prepared snapshots are shared by all variants, communities by variants with the same resolution.
+
+    Parameter:
+    - grid: JSON file with list of values per setting, e.g. {"COMMUNITY_CORE_SIZE": [25, 50], "MATCHING_MEMORY": [2, 4]}
+    - workers: number of variants processed in parallel
+    """
+
+    with open(grid) as f:
+        grid = json.load(f)
+
+    assert set(grid) <= set(SWEEP_PARAMETERS), f"Only these settings can be swept: {SWEEP_PARAMETERS}"
+
+    names = sorted(grid)
+    variants = [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+    # shared: prepared snapshots
+    prepare_data(workers=workers)
+    os.makedirs(SWEEP_DIR, exist_ok=True)
+
+    # shared: communities of snapshots per resolution (default resolution: communities of default directory), the
+    # temporal matching of the main run is not touched
+    for resolution in sorted({variant.get("LEIDEN_RESOLUTION", LEIDEN_RESOLUTION) for variant in variants}):
+        directory = community_dir(resolution)
+        os.makedirs(directory, exist_ok=True)
+        log = os.path.join(SWEEP_DIR, f"communities-leiden_resolution={resolution}")
+        run_stages(({"LEIDEN_RESOLUTION": resolution, "COMMUNITY_DIR": directory, "LOG_FILE": log + ".log",
+                     "NUM_WORKERS": workers}, ["--snapshot_communities"], log + "-stderr.log"))
+
+    # per variant: community cores, temporal matching and trends
+    runs = []
+    for variant in variants:
+        directory = os.path.join(SWEEP_DIR, ",".join(f"{name.lower()}={value}" for name, value in variant.items()))
+        os.makedirs(directory, exist_ok=True)
+        with atomic_open(os.path.join(directory, "variant.json")) as f:
+            json.dump(variant, f, indent=4)
+
+        overrides = dict(variant, COMMUNITY_DIR=community_dir(variant.get("LEIDEN_RESOLUTION", LEIDEN_RESOLUTION)),
+                         MATCHING_DIR=directory, TRENDS_DIR=os.path.join(directory, "trends"),
+                         LOG_FILE=os.path.join(directory, "main.log"), NUM_WORKERS=1)
+        runs.append((overrides, ["--communities", "--trends"], os.path.join(directory, "stderr.log")))
+
+    parallel_map(run_stages, runs, workers=workers, desc="variants")
@@ -1,100 +1,296 @@
 import logging
-import math
 import os
 import pickle
+import random
 
 import igraph as ig
+import numpy as np
 from tqdm import tqdm
 
-from utils import (COMMUNITY_CORE_SIZE, EDGE_DIR, degree_distro,
-                   detect_communities, extract_representatives,
-                   get_node_occurrences, matching, tweets_in_time_window)
+from utils import (BATCHED_CENTRALITY, CENTRALITY_DECIMALS,
+                   COMMUNITY_CORE_SIZE, COMMUNITY_DIR, EDGE_DIR, GRAPH_FORMAT,
+                   GRAPH_SUFFIXES, MATCHING_ASSIGNMENT, MATCHING_DIR,
+                   MATCHING_ENGINE, MATCHING_MEMORY, MATCHING_THRESHOLD,
+                   MATCHING_WORKERS, MINHASH_PERMUTATIONS, NODE_DIR,
+                   NUM_WORKERS, PMI_VARIANT, SEED, WARM_START, MappedGraph,
+                   aggregate_temporal_communities, artifact_key, atomic_open,
+                   community_pagerank, degree_distro, detect_communities,
+                   extract_representatives, get_node_occurrences, graph_file,
+                   graph_name, grouped_top_k, is_cached, mark_cached, match,
+                   node_ids, node_key, node_names, parallel_map, pmi,
+                   read_graph, trend_manifest, tweets_in_time_window,
+                   vocabulary_origin, warm_start_membership,
+                   write_community_store, write_graph, write_trend_manifest)
 
 
-def temporal_communities():
+def snapshot_network(f: str) -> ig.Graph:
     """
-    Detection of temporal communities (per snapshot).
+    Network of a single snapshot prepared for community detection
+    (without "unimportant" nodes, node occurrences as node weights, PMI as edge weights).
+
+    Parameter:
+    - f: file name of snapshot network (inside EDGE_DIR)
+
+    Return:
+    - igraph network/graph instance
     """
 
-    # clean up old data (communities and degree distributions)
-    os.system(f"cd {EDGE_DIR} && rm -rf *-com* && rm -rf *.png")
+    # get network (columnar format: memory-mapped, degree filter applied before building igraph instance)
+    f_path = os.path.join(EDGE_DIR, f)
+    g = MappedGraph(f_path) if f.endswith(GRAPH_SUFFIXES["columnar"]) else ig.Graph.Read_Pickle(f_path)
 
-    # for every network snapshot detect communities
-    snapshot_files = [f for f in os.listdir(EDGE_DIR) if os.path.isfile(
-        os.path.join(EDGE_DIR, f)) and f.endswith(".pkl")]
-    snapshot_files = sorted(snapshot_files, key=(lambda f: int(f.split("-")[0])), reverse=False)
+    # extract time windows used to aggregate network into snapshot
+    ts1 = int(f.split("-")[0])
+    ts2 = int(f.split("-")[1].split(".")[0])
 
-    for f in tqdm(snapshot_files, desc="snapshots"):
-        # get network
-        f_path = os.path.join(EDGE_DIR, f)
-        g = ig.Graph.Read_Pickle(f_path)
+    # pre-aggregated networks carry co-occurrence counts as edge weights
+    # (weighted degree equals degree of network with one edge per co-occurrence)
+    aggregated = "weight" in (g.edge_attributes() if isinstance(g, MappedGraph) else g.es.attributes())
 
-        # extract time windows used to aggregate network into snapshot
-        ts1 = int(f.split("-")[0])
-        ts2 = int(f.split("-")[1].split(".")[0])
+    # remove "unimportant" nodes (degree below median)
+    # already done during data preparation for pruned networks
+    if "median" not in g.attributes():
+        degrees = [int(d) for d in g.strength(weights="weight")] if aggregated else list(g.degree())
+        median = degree_distro(degrees=degrees, file=os.path.join(
+            "figures/degree-distro", graph_name(f) + ".png"))
+        if isinstance(g, MappedGraph):
+            g = g.to_igraph(vertices=np.flatnonzero(np.array(degrees) >= median))
+        else:
+            g.delete_vertices([v for v, d in enumerate(degrees) if d < median])
+    elif isinstance(g, MappedGraph):
+        g = g.to_igraph()
 
-        # remove "unimportant" nodes (degree below median)
-        median = degree_distro(degrees=g.degree(), file=os.path.join(
-            "figures/degree-distro", f.split(".pkl")[0] + ".png"))
-        g.delete_vertices(g.vs.select(_degree_lt=median))
+    # nodes as ids of hashtag vocabulary (shared by all snapshots), labels are only resolved for outputs
+    if "id" not in g.vs.attributes():
+        try:
+            g.vs["id"] = node_ids(g.vs["name"]).tolist()
+            del g.vs["name"]
+        except (FileNotFoundError, KeyError):
+            logging.info(f"Node names of {f} not in hashtag vocabulary, nodes identified by name.")
 
-        # weights of nodes = node occurrence during time window
-        node_occurrences = get_node_occurrences(ts1, ts2, [v["name"] for v in g.vs])
-        g.vs["weight"] = node_occurrences
+    # weights of nodes = node occurrence during time window
+    if "id" in g.vs.attributes():
+        node_occurrences = get_node_occurrences(ts1, ts2, None, ids=g.vs["id"])
+    else:
+        node_occurrences = get_node_occurrences(ts1, ts2, g.vs["name"])
+    g.vs["weight"] = node_occurrences
 
-        # simplify network
+    # simplify network (no-op for pre-aggregated networks apart from loops)
+    if not aggregated:
         g.es["weight"] = [1 for _ in range(g.ecount())]
-        g.simplify(multiple=True, loops=True, combine_edges=dict(weight="sum", timestamp="ignore"))
-
-        # number of tweets in time window
-        total_tweets = tweets_in_time_window(ts1, ts2)
-
-        # use PMI (point-wise mutual information) as edge weight
-        # PMI(node_1; node_2) = log(p(co-occurrence node_1 and node_2)/(p(occurrence node_1) * p(occurrence node_2)))
-        # probability -> frequency
-        new_weights = []
-        for e in g.es():
-            p1 = g.vs[e.tuple[0]]["weight"]
-            p1 = p1 / total_tweets
-            p2 = g.vs[e.tuple[1]]["weight"]
-            p2 = p2 / total_tweets
-            p12 = e["weight"] / total_tweets
-            pmi = math.log(p12 / (p1 * p2))
-            new_weights.append(pmi)
-
-        g.es["weight"] = new_weights
-
-        # community detection
-        membership = detect_communities(g=g, method="leiden", membership=True)
-        g.vs["community"] = membership
-
-        # save network
-        g.write_pickle(os.path.join(EDGE_DIR, (f.split(".pkl")[0] + "-com" + ".pkl")))
-
-    # extract temporal communities
-    temporal_communities_files = [f for f in os.listdir(EDGE_DIR) if os.path.isfile(
-        os.path.join(EDGE_DIR, f)) and f.endswith("-com.pkl")]
-    temporal_communities_files = sorted(temporal_communities_files, key=(lambda f: int(f.split("-")[0])), reverse=False)
+    g.simplify(multiple=True, loops=True, combine_edges=dict(weight="sum", timestamp="ignore"))
 
-    temporal_communities_formatted = []  # format needed for temporal matching
+    # number of tweets in time window
+    total_tweets = tweets_in_time_window(ts1, ts2)
+
+    # use PMI (point-wise mutual information) as edge weight
+    g.es["weight"] = pmi(g, total=total_tweets, variant=PMI_VARIANT)
+
+    return g
+
+
+def snapshot_communities(f: str, previous: str = None) -> str:
+    """
+    Detection of communities of a single snapshot.
+
+    Parameter:
+    - f: file name of snapshot network (inside EDGE_DIR)
+    - previous: file of previous snapshot network with communities (warm start from its partition)
+
+    Return:
+    - file of stored network (with community membership as node attribute)
+    """
+
+    # communities depend on network, node occurrences and number of tweets of snapshot (and previous partition) as
+    # well as the hashtag vocabulary (node ids)
+    ts1, ts2 = int(f.split("-")[0]), int(f.split("-")[1].split(".")[0])
+    file = graph_file(os.path.join(COMMUNITY_DIR, (graph_name(f) + "-com")))
+    store_file = os.path.join(COMMUNITY_DIR, (graph_name(f) + "-com-store" + ".npz"))
+    inputs = [os.path.join(EDGE_DIR, f), os.path.join(NODE_DIR, f"{ts1}-{ts2}.csv")] + ([previous] if previous else [])
+    key = artifact_key("communities", [_ for _ in inputs if os.path.exists(_)],
+                       values={"tweets": int(tweets_in_time_window(ts1, ts2)), "vocabulary": vocabulary_origin()})
+    if is_cached(file, key) and is_cached(store_file, key):
+        return file
+
+    # seed per snapshot, results do not depend on order/parallelism of execution
+    if SEED is not None:
+        random.seed(SEED + int(f.split("-")[0]))
+
+    g = snapshot_network(f)
 
-    for f in tqdm(temporal_communities_files, desc="snapshots"):  # communities are temporally sorted at this point
-        g = ig.Graph.Read_Pickle(os.path.join(EDGE_DIR, f))
-        clustering = ig.VertexClustering(g, g.vs["community"])
+    # initial partition: communities of previous snapshot (matched by hashtag), new hashtags as singletons
+    initial_membership = []
+    if previous is not None:
+        g_prev = read_graph(previous)
+        initial_membership = warm_start_membership(g, dict(zip(g_prev.vs[node_key(g_prev)], g_prev.vs["community"])))
 
-        communities_snapshot = {}
+    # community detection
+    membership = detect_communities(g=g, method="leiden", membership=True, initial_membership=initial_membership)
+    g.vs["community"] = membership
 
+    # save network and all communities of snapshot in one file
+    file = write_graph(g, os.path.join(COMMUNITY_DIR, (graph_name(f) + "-com")))
+    write_community_store(g, store_file)
+    mark_cached(file, key)
+    mark_cached(store_file, key)
+
+    return file
+
+
+def snapshot_cores(f: str) -> tuple[dict, np.ndarray]:
+    """
+    Community cores (most central nodes) and scores of all communities of a single snapshot (stored in MATCHING_DIR).
+
+    Parameter:
+    - f: file name of snapshot network with communities (inside COMMUNITY_DIR)
+
+    Return:
+    - community cores (community id -> set of node ids) and sum of node occurrences per community
+    """
+
+    cores_file = os.path.join(MATCHING_DIR, (graph_name(f) + "-cores" + ".pkl"))
+    key = artifact_key("cores", [os.path.join(COMMUNITY_DIR, f)], values={"vocabulary": vocabulary_origin()})
+    if is_cached(cores_file, key):
+        with open(cores_file, "rb") as fp:
+            return pickle.load(fp)
+
+    g = read_graph(os.path.join(COMMUNITY_DIR, f))
+    clustering = ig.VertexClustering(g, g.vs["community"])
+    community_scores = np.bincount(g.vs["community"], weights=g.vs["weight"], minlength=len(clustering))
+
+    communities_snapshot = {}
+
+    if BATCHED_CENTRALITY:
+        # most central nodes of all communities at once
+        nodes = np.array(g.vs[node_key(g)], dtype=np.int64 if node_key(g) == "id" else object)
+        centralities = np.round(community_pagerank(g, g.vs["community"]), CENTRALITY_DECIMALS)
+        for i, central_nodes in enumerate(grouped_top_k(centralities, g.vs["community"],
+                                                        max(COMMUNITY_CORE_SIZE, 10))):
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                representatives = nodes[central_nodes[:10]].tolist()
+                logging.info(f"Community subgraph: "
+                             f"{node_names(representatives) if node_key(g) == 'id' else representatives}")
+            communities_snapshot[i] = set(nodes[central_nodes[:COMMUNITY_CORE_SIZE]].tolist())
+    else:
         # community subgraph
         for i in range(len(clustering)):
             g_sub = clustering.subgraph(i)
-            logging.info(f"Community subgraph: {extract_representatives(g_sub)}")
-            communities_snapshot[i] = set(extract_representatives(g_sub, num=COMMUNITY_CORE_SIZE))
-            g_sub.write_pickle(os.path.join(EDGE_DIR, (f.split(".pkl")[0] + f"-{i}" + ".pkl")))
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                logging.info(f"Community subgraph: {extract_representatives(g_sub)}")
+            communities_snapshot[i] = set(extract_representatives(g_sub, num=COMMUNITY_CORE_SIZE, attr=node_key(g_sub)))
+
+    with atomic_open(cores_file, "wb") as fp:
+        pickle.dump((communities_snapshot, community_scores), fp)
+    mark_cached(cores_file, key)
+
+    return communities_snapshot, community_scores
+
+
+def snapshot_network_files() -> list[str]:
+    """
+    Snapshot networks (temporally sorted).
+
+    Return:
+    - file names of snapshot networks (inside EDGE_DIR)
+    """
+
+    snapshot_files = [f for f in os.listdir(EDGE_DIR) if f.endswith(GRAPH_SUFFIXES[GRAPH_FORMAT]) and "-com" not in f]
+
+    return sorted(snapshot_files, key=(lambda f: int(f.split("-")[0])), reverse=False)
+
+
+def detect_snapshot_communities(snapshot_files: list[str] = None, workers: int = NUM_WORKERS, previous: str = None):
+    """
+    Detection of communities of snapshots (stored in COMMUNITY_DIR), without temporal matching.
+
+    Parameter:
+    - snapshot_files: file names of snapshot networks (inside EDGE_DIR, temporally sorted; default: all snapshots)
+    - workers: number of snapshots processed in parallel (ignored for warm start)
+    - previous: (warm start) file of network with communities of the snapshot before the first one
+    """
+
+    snapshot_files = snapshot_network_files() if snapshot_files is None else snapshot_files
+
+    if WARM_START:
+        # sequential, every snapshot starts from partition of previous snapshot
+        for f in tqdm(snapshot_files, desc="snapshots"):
+            previous = snapshot_communities(f, previous=previous)
+    else:
+        parallel_map(snapshot_communities, snapshot_files, workers=workers, desc="snapshots")
+
+
+def temporal_communities(workers: int = NUM_WORKERS, incremental: bool = False):
+    """
+    Detection of temporal communities (per snapshot).
 
+    Parameter:
+    - workers: number of snapshots processed in parallel (ignored for warm start)
+    - incremental: only process snapshots without communities and continue the temporal matching of the others
+      (otherwise communities are detected for all snapshots whose communities are not up to date)
+    """
+
+    state_file = os.path.join(MATCHING_DIR, "matched-communities-state.pkl")
+
+    # for every network snapshot detect communities
+    snapshot_files = snapshot_network_files()
+
+    # snapshots with communities (from previous runs)
+    processed = []
+    if incremental:
+        processed = [f for f in snapshot_files
+                     if os.path.exists(os.path.join(COMMUNITY_DIR, graph_file(graph_name(f) + "-com")))]
+        assert processed == snapshot_files[:len(processed)], "Snapshots can only be appended in incremental mode."
+        assert not processed or os.path.isfile(state_file), "No matcher state found, run without incremental mode."
+        snapshot_files = snapshot_files[len(processed):]
+
+    previous = os.path.join(COMMUNITY_DIR, graph_file(graph_name(processed[-1]) + "-com")) if processed else None
+    detect_snapshot_communities(snapshot_files, workers=workers, previous=previous)
+
+    # extract temporal communities (communities are temporally sorted)
+    temporal_communities_files = [graph_file(graph_name(f) + "-com") for f in snapshot_files]
+
+    temporal_communities_formatted = []  # format needed for temporal matching
+    community_scores = []  # per snapshot: sum of node occurrences per community
+
+    for f in tqdm(temporal_communities_files, desc="snapshots"):
+        communities_snapshot, scores = snapshot_cores(f)
         temporal_communities_formatted.append(communities_snapshot)
+        community_scores.append(scores)
+
+    # matcher state: matched communities and community cores within memory of all processed snapshots
+    state = {"temporal_communities_dict": {}, "cores": [], "num_snapshots": 0, "memory": MATCHING_MEMORY,
+             "vocabulary": vocabulary_origin()}
+    cores = []
+    if processed:
+        with open(state_file, "rb") as fp:
+            state = pickle.load(fp)
+        assert state["memory"] == MATCHING_MEMORY, "Matching memory changed, run without incremental mode."
+        assert state.get("vocabulary") == vocabulary_origin(), "Hashtag vocabulary rebuilt, run without incremental mode."
+
+        with open(os.path.join(MATCHING_DIR, "temporal-community-cores.pkl"), "rb") as fp:
+            cores = pickle.load(fp)
+        community_scores = [np.array(scores) for scores in trend_manifest()["community_scores"]] + community_scores
 
-    # temporal matching
-    matched_communities = matching(temporal_communities_formatted, memory=4)
+    # community cores of all snapshots (input of temporal matching)
+    with atomic_open(os.path.join(MATCHING_DIR, "temporal-community-cores.pkl"), "wb") as fp:
+        pickle.dump(cores + temporal_communities_formatted, fp)
 
-    with open(os.path.join(EDGE_DIR, "matched-communities.pkl"), "wb") as fp:
+    # temporal matching (communities of snapshots out of memory are not needed anymore)
+    timeseries = [{}] * (state["num_snapshots"] - len(state["cores"])) + state["cores"] + temporal_communities_formatted
+    temporal_communities_dict = match(timeseries, memory=MATCHING_MEMORY, engine=MATCHING_ENGINE,
+                                      assignment=MATCHING_ASSIGNMENT, workers=MATCHING_WORKERS,
+                                      score_threshold=MATCHING_THRESHOLD, num_perm=MINHASH_PERMUTATIONS,
+                                      start=state["num_snapshots"],
+                                      initial=state["temporal_communities_dict"])
+    matched_communities = list(aggregate_temporal_communities(temporal_communities_dict).values())
+
+    state = {"temporal_communities_dict": temporal_communities_dict, "cores": timeseries[-MATCHING_MEMORY:],
+             "num_snapshots": len(timeseries), "memory": MATCHING_MEMORY, "vocabulary": vocabulary_origin()}
+    with atomic_open(state_file, "wb") as fp:
+        pickle.dump(state, fp)
+
+    with atomic_open(os.path.join(MATCHING_DIR, "matched-communities.pkl"), "wb") as fp:
         pickle.dump(matched_communities, fp)
+
+    # trend scores and ranking of trends
+    write_trend_manifest(matched_communities, community_scores)
@@ -4,23 +4,33 @@ import os
 import pickle
 from datetime import datetime, timezone
 
-import igraph as ig
 from tqdm import tqdm
 
-from utils import (EDGE_DIR, NUM_TRENDS, TRENDS_DIR, extract_representatives,
-                   graph_union, igraph2trend, time_windows)
+from utils import (MATCHING_DIR, NUM_TRENDS, TRENDS_DIR, atomic_open,
+                   community_store, extract_representatives, graph_union_all,
+                   igraph2trend, time_windows, trend_manifest)
 
 
-def trends():
+def trends(incremental: bool = False):
     """
     Detect trends and store in JSON format.
+
+    Parameter:
+    - incremental: only update trends whose communities changed since the last run
     """
 
-    # cleanup of trends directory
-    os.system("rm -rf ./data/trends && mkdir ./data/trends && bash ./scripts/init-trends-dir.sh")
+    # matched communities per trend of last run (incremental mode)
+    outputs_file = os.path.join(MATCHING_DIR, "trend-outputs.json")
+    outputs = []
+    if incremental and os.path.isfile(outputs_file):
+        with open(outputs_file) as f:
+            outputs = json.load(f)
+    else:
+        # cleanup of trends directory
+        os.system(f"rm -rf {TRENDS_DIR} && mkdir -p {TRENDS_DIR} && bash ./scripts/init-trends-dir.sh {TRENDS_DIR}")
 
     # temporally matched communities (across snapshots)
-    with open(os.path.join(EDGE_DIR, "matched-communities.pkl"), "rb") as fp:
+    with open(os.path.join(MATCHING_DIR, "matched-communities.pkl"), "rb") as fp:
         matched_communities = pickle.load(fp)
 
     # time windows
@@ -29,24 +39,9 @@ def trends():
         f"{datetime.fromtimestamp(t[0], tz=timezone.utc).date()} - {datetime.fromtimestamp(t[1], tz=timezone.utc).date()}"
         for t in tw]
 
-    # find overall trend scores per trend
-    trend_scores = []
-    for trend_complete in tqdm(matched_communities, desc="trends"):
-        trend_score_complete = 0
-
-        # trend snapshots
-        # trend_snapshot: tuples (snapshot, community id)
-        for trend_snapshot in sorted(trend_complete, key=(lambda _: _[0])):
-            graph_file = f"{tw[trend_snapshot[0]][0]}-{tw[trend_snapshot[0]][1]}-com-{trend_snapshot[1]}.pkl"
-            g_cur = ig.Graph.Read_Pickle(os.path.join(EDGE_DIR, graph_file))
-
-            # trend score: sum of node occurrences of graph
-            trend_score_complete += sum([n["weight"] for n in g_cur.vs])
-
-        trend_scores.append(trend_score_complete)
-
-    # sort trend according to overall popularity
-    _, matched_communities = zip(*sorted(zip(trend_scores, matched_communities), reverse=True))
+    # trend scores and trends sorted according to overall popularity
+    manifest = trend_manifest()
+    matched_communities = [matched_communities[i] for i in manifest["ranking"]]
 
     if len(matched_communities) < NUM_TRENDS:
         raise Exception("Not enough trends found!")
@@ -55,35 +50,49 @@ def trends():
 
     # trend_complete: list of tuples like trend_snapshot (see below)
     for trend_id, trend_complete in tqdm(enumerate(matched_communities), desc="trends"):
-        g_com = ig.Graph()
+        communities = sorted([list(_) for _ in trend_complete])
+        if trend_id < len(outputs):
+            if outputs[trend_id] == communities:
+                continue
+
+            # remove networks of snapshots that are not part of trend anymore
+            for snapshot_id in {_[0] for _ in outputs[trend_id]} - {_[0] for _ in communities}:
+                os.remove(os.path.join(TRENDS_DIR, f"{snapshot_id}/{trend_id}/network.json"))
+
+        graphs = []
         # community snapshots
         # trend_snapshot: tuples (snapshot, community id)
         for trend_snapshot in sorted(trend_complete, key=(lambda _: _[0])):
-            graph_file = f"{tw[trend_snapshot[0]][0]}-{tw[trend_snapshot[0]][1]}-com-{trend_snapshot[1]}.pkl"
-            g_cur = ig.Graph.Read_Pickle(os.path.join(EDGE_DIR, graph_file))
+            g_cur = community_store(tw[trend_snapshot[0]]).subgraph(trend_snapshot[1])
 
             # trend score: sum of node occurrences of graph
-            trend_score = sum([n["weight"] for n in g_cur.vs])
+            trend_score = manifest["community_scores"][trend_snapshot[0]][trend_snapshot[1]]
 
             # log evolution
-            rep = extract_representatives(g_cur)
-            logging.info(f"Time window: {tw_formatted[trend_snapshot[0]]} | Trend score: {trend_score} -> {rep}")
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                rep = extract_representatives(g_cur)
+                logging.info(f"Time window: {tw_formatted[trend_snapshot[0]]} | Trend score: {trend_score} -> {rep}")
 
             # save network as JSON file
             # centrality score is taken as new node weight
             network = igraph2trend(g=g_cur, trend_score=trend_score)
-            with open(os.path.join(TRENDS_DIR, f"{trend_snapshot[0]}/{trend_id}/network.json"), "w") as f:
+            os.makedirs(os.path.join(TRENDS_DIR, f"{trend_snapshot[0]}/{trend_id}"), exist_ok=True)
+            with atomic_open(os.path.join(TRENDS_DIR, f"{trend_snapshot[0]}/{trend_id}/network.json")) as f:
                 json.dump(network.dict(), f, sort_keys=True, indent=4)
 
-            if g_com.vcount() == 0:  # initial state when graph is empty
-                g_com = g_cur.copy()
-            else:
-                g_com = graph_union(g_com, g_cur)
+            graphs.append(g_cur)
 
+        g_com = graph_union_all(graphs)
         trend_score = sum([n["weight"] for n in g_com.vs])
         network = igraph2trend(g=g_com, trend_score=trend_score)
-        with open(os.path.join(TRENDS_DIR, f"complete/{trend_id}/network.json"), "w") as f:
+        os.makedirs(os.path.join(TRENDS_DIR, f"complete/{trend_id}"), exist_ok=True)
+        with atomic_open(os.path.join(TRENDS_DIR, f"complete/{trend_id}/network.json")) as f:
             json.dump(network.dict(), f, sort_keys=True, indent=4)
 
-        rep = extract_representatives(g_com)
-        logging.info(f"Aggregated | Trend score: {trend_score} -> {rep}\n")
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            rep = extract_representatives(g_com)
+            logging.info(f"Aggregated | Trend score: {trend_score} -> {rep}\n")
+
+    # matched communities per trend (compared in next incremental run)
+    with atomic_open(outputs_file) as f:
+        json.dump([sorted([list(_) for _ in trend_complete]) for trend_complete in matched_communities], f)
@@ -1,35 +1,49 @@
 import argparse
 import logging
 
-from analysis import (plot_alluvial, plot_network, plot_timeline, prepare_data,
-                      temporal_communities, trends)
+from analysis import (benchmark, detect_snapshot_communities, plot_alluvial,
+                      plot_degree_distro, plot_network, plot_timeline,
+                      prepare_data, sweep, temporal_communities, trends)
+from utils import LOG_FILE, NUM_WORKERS
 
 if __name__ == "__main__":
     # parse command line arguments
     parser = argparse.ArgumentParser()
     parser.add_argument("--prepare", help="prepare data", action="store_true")
     parser.add_argument("--communities", help="detect temporal communities", action="store_true")
+    parser.add_argument("--snapshot_communities", help="detect communities of snapshots only (no temporal matching)",
+                        action="store_true")
     parser.add_argument("--trends", help="extract trends", action="store_true")
     parser.add_argument("--plot_network", help="plot network of given snapshot and trend id", nargs="+", type=int)
     parser.add_argument("--plot_timeline", help="plot timeline of trends", action="store_true")
     parser.add_argument("--plot_alluvial", help="plot alluvial diagram", type=int)
+    parser.add_argument("--plot_degree_distro", help="plot degree distributions (histogram fit)", action="store_true")
+    parser.add_argument("--benchmark", help="run benchmark", choices=["ingest", "warm_start", "matching"])
+    parser.add_argument("--sweep", help="run parameter sweep (JSON file with list of values per setting)")
+    parser.add_argument("--incremental", help="only process new snapshots (prepare, communities, trends)",
+                        action="store_true")
+    parser.add_argument("--workers", help="number of worker processes (default: NUM_WORKERS in config)", type=int)
 
     args = parser.parse_args()
 
     # logging
-    logging.basicConfig(filename="main.log", level=logging.INFO, filemode="w", format="%(message)s")
+    logging.basicConfig(filename=LOG_FILE, level=logging.INFO, filemode="w", format="%(message)s")
 
     if args.prepare:
         print("Prepare data ...\n")
-        prepare_data()
+        prepare_data(workers=args.workers or NUM_WORKERS, incremental=args.incremental)
 
     if args.communities:
         print("Detect temporal communities ...\n")
-        temporal_communities()
+        temporal_communities(workers=args.workers or NUM_WORKERS, incremental=args.incremental)
+
+    if args.snapshot_communities:
+        print("Detect communities of snapshots ...\n")
+        detect_snapshot_communities(workers=args.workers or NUM_WORKERS)
 
     if args.trends:
         print("Extract trends ...\n")
-        trends()
+        trends(incremental=args.incremental)
 
     if args.plot_network:
         snapshot_id, trend_id = tuple(args.plot_network)
@@ -41,5 +55,15 @@ if __name__ == "__main__":
     if args.plot_alluvial:
         plot_alluvial(snapshot_id=args.plot_alluvial)
 
-    if not args.prepare and not args.communities and not args.trends and not args.plot_network and not args.plot_timeline and not args.plot_alluvial:
+    if args.plot_degree_distro:
+        plot_degree_distro()
+
+    if args.benchmark:
+        benchmark(name=args.benchmark)
+
+    if args.sweep:
+        print("Run parameter sweep ...\n")
+        sweep(grid=args.sweep, workers=args.workers or NUM_WORKERS)
+
+    if not args.prepare and not args.communities and not args.snapshot_communities and not args.trends and not args.plot_network and not args.plot_timeline and not args.plot_alluvial and not args.plot_degree_distro and not args.benchmark and not args.sweep:
         print("Please select task!")
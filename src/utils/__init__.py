@@ -1,7 +1,11 @@
 from .alluvial import *
+from .cache import *
 from .config import *
 from .data import *
 from .graph import *
 from .matching import *
+from .parallel import *
 from .similarity import *
+from .store import *
 from .trend import *
+from .vocabulary import *
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import IO, Iterator
+
+from . import config
+
+# config values per stage the stored artifacts depend on
+STAGE_CONFIG = {
+    "prepare": ["INGEST_ENGINE", "GRAPH_FORMAT", "DEGREE_FIT"],
+    "communities": ["SEED", "LEIDEN_RESOLUTION", "ADAPTIVE_RESTARTS", "RESTART_PATIENCE", "RESTART_EPSILON",
+                    "WARM_START", "PMI_VARIANT", "GRAPH_FORMAT", "DEGREE_FIT"],
+    "cores": ["COMMUNITY_CORE_SIZE", "BATCHED_CENTRALITY"],
+}
+
+
+@contextmanager
+def atomic_open(file: str, mode: str = "w") -> Iterator[IO]:
+    """
+    Open file for writing atomically: data is written to a temporary file which replaces the file once writing
+    succeeded (interrupted runs do not leave partial files).
+
+    Parameter:
+    - file: file to write
+    - mode: file mode (w or wb)
+
+    Return:
+    - file object
+    """
+
+    with open(file + ".tmp", mode) as fp:
+        try:
+            yield fp
+        except BaseException:
+            fp.close()
+            os.remove(file + ".tmp")
+            raise
+    os.replace(file + ".tmp", file)
+
+
+@lru_cache(maxsize=None)
+def _content_hash(file: str, mtime: int, size: int) -> str:
+    """
+    SHA-256 of file content or of all files inside a directory (with their relative paths).
+    Cached per modification time and size.
+    """
+
+    h = hashlib.sha256()
+
+    files = [("", file)] if os.path.isfile(file) else sorted(
+        (os.path.relpath(os.path.join(root, f), file), os.path.join(root, f))
+        for root, _, names in os.walk(file) for f in names)
+
+    for name, path in files:
+        h.update(name.encode("utf-8"))
+        with open(path, "rb") as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b""):
+                h.update(chunk)
+
+    return h.hexdigest()
+
+
+def content_hash(file: str) -> str:
+    """
+    SHA-256 of file content (directories: content of all files).
+
+    Parameter:
+    - file: file or directory
+
+    Return:
+    - hex digest
+    """
+
+    stat = os.stat(file)
+
+    return _content_hash(os.path.abspath(file), stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=1)
+def code_version() -> str:
+    """
+    Version of the analysis code: hash of all Python sources (apart from the config, its values are part of the
+    artifact keys per stage).
+
+    Return:
+    - hex digest
+    """
+
+    src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    h = hashlib.sha256()
+    for root, dirs, names in sorted(os.walk(src)):
+        dirs.sort()
+        for f in sorted(names):
+            if f.endswith(".py") and os.path.join(root, f) != os.path.abspath(config.__file__):
+                h.update(os.path.relpath(os.path.join(root, f), src).encode("utf-8"))
+                with open(os.path.join(root, f), "rb") as fp:
+                    h.update(fp.read())
+
+    return h.hexdigest()
+
+
+def artifact_key(stage: str, inputs: list[str], values: dict = None) -> str:
+    """
+    Key of an artifact: hash of its input files, the config values of the stage, further values it depends on and the
+    version of the code.
+
+    Parameter:
+    - stage: stage creating the artifact (see STAGE_CONFIG)
+    - inputs: input files
+    - values: further values the artifact depends on (JSON serializable)
+
+    Return:
+    - hex digest
+    """
+
+    description = {
+        "stage": stage,
+        "inputs": [content_hash(f) for f in inputs],
+        "config": {name: getattr(config, name) for name in STAGE_CONFIG[stage]},
+        "values": values or {},
+        "code": code_version(),
+    }
+
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def is_cached(file: str, key: str) -> bool:
+    """
+    Check if artifact is up to date (exists and was stored with the same key). The key of an outdated artifact is
+    removed, so an artifact that is rewritten but not marked as cached (interrupted run) is never valid.
+
+    Parameter:
+    - file: file of artifact
+    - key: artifact key (see artifact_key)
+
+    Return:
+    - up to date?
+    """
+
+    if os.path.isfile(file + ".key"):
+        with open(file + ".key") as fp:
+            if fp.read() == key and os.path.exists(file):
+                return True
+        os.remove(file + ".key")
+
+    return False
+
+
+def mark_cached(file: str, key: str):
+    """
+    Store key of artifact next to it (after the artifact itself was written).
+
+    Parameter:
+    - file: file of artifact
+    - key: artifact key (see artifact_key)
+    """
+
+    with atomic_open(file + ".key") as fp:
+        fp.write(key)
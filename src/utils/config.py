@@ -1,8 +1,48 @@
+import json
+import os
+
 DATA_DIR = "data"
 EDGE_DIR = "./data/edges"
 NODE_DIR = "./data/nodes"
 TRENDS_DIR = "./data/trends"
+INDEX_DIR = "./data/index"
+COMMUNITY_DIR = None  # networks with communities, community stores (None: EDGE_DIR)
+MATCHING_DIR = None  # community cores, matched communities, trend manifest (None: EDGE_DIR)
+SWEEP_DIR = "./data/sweeps"  # output namespaces of parameter sweep variants
+LOG_FILE = "main.log"
 NUM_SNAPSHOTS = 18
 NUM_TRENDS = 10
 COMMUNITY_CORE_SIZE = 25
 START = "2021-01-01"
+INGEST_ENGINE = "columnar"  # tuples, columnar, aggregated (out-of-core, weighted) or pruned (aggregated, two-pass degree filter)
+EDGE_CHUNKSIZE = 1000000  # rows per chunk of out-of-core edge list ingest
+NUM_WORKERS = 4  # worker processes for per-snapshot stages (1: sequential)
+MAX_IN_FLIGHT = 4  # maximum number of snapshots processed/queued at once (bounds memory)
+SEED = 42  # seed of community detection (per snapshot); None: not seeded
+RESTART_WORKERS = 1  # worker processes for restarts of community detection (per snapshot)
+ADAPTIVE_RESTARTS = False  # Leiden until convergence, restarts until no improvement (instead of fixed budget)
+RESTART_PATIENCE = 2  # adaptive: consecutive restarts without improvement before stopping
+RESTART_EPSILON = 1e-4  # adaptive: minimum modularity gain counted as improvement
+LEIDEN_RESOLUTION = 1  # resolution parameter of Leiden (modularity)
+WARM_START = False  # start community detection from partition of previous snapshot (snapshots run sequentially)
+PMI_VARIANT = "pmi"  # edge weight of snapshot networks: pmi, npmi (normalized) or ppmi (positive)
+GRAPH_FORMAT = "pickle"  # snapshot networks on disk: pickle or columnar (memory-mapped arrays, shared vocabulary)
+BATCHED_CENTRALITY = False  # PageRank of all communities of a snapshot in one call (no community subgraphs)
+DEGREE_FIT = "powerlaw"  # degree distribution fit: powerlaw (with plot) or histogram (fast, plot via --plot_degree_distro)
+MATCHING_ENGINE = "sparse"  # jaccard scores of temporal matching: sets (pairwise), sparse (incidence matrix product) or minhash (lsh candidates, approximate)
+MATCHING_MEMORY = 4  # number of snapshots to look back in temporal matching
+MATCHING_THRESHOLD = .1  # minimum (memory weighted) jaccard index of matched communities
+MINHASH_PERMUTATIONS = 128  # minhash signature length of approximate matching
+MATCHING_ASSIGNMENT = "dense"  # assignment of temporal matching: dense (full cost matrix) or sparse (per connected component)
+MATCHING_WORKERS = 1  # processes solving the components of the sparse assignment
+
+# overrides of the values above (JSON object), e.g. per variant of a parameter sweep
+_overrides = json.loads(os.environ.get("TRENDS_CONFIG", "{}"))
+_unknown = sorted(set(_overrides) - {name for name in globals() if name.isupper()})
+if _unknown:
+    raise Exception(f"Unknown settings in TRENDS_CONFIG: {_unknown}")
+globals().update(_overrides)
+
+# directories derived from (overridden) EDGE_DIR
+COMMUNITY_DIR = COMMUNITY_DIR or EDGE_DIR
+MATCHING_DIR = MATCHING_DIR or EDGE_DIR
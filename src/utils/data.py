@@ -1,11 +1,23 @@
 import os
 from datetime import datetime, timezone
+from functools import lru_cache
+from typing import NamedTuple
 
 import igraph as ig
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from dateutil.relativedelta import relativedelta
 
-from .config import DATA_DIR, NODE_DIR, NUM_SNAPSHOTS, START
+from .cache import atomic_open
+from .config import (DATA_DIR, EDGE_CHUNKSIZE, EDGE_DIR, INDEX_DIR, NODE_DIR,
+                     NUM_SNAPSHOTS, START)
+from .graph import degree_distro
+from .vocabulary import (Vocabulary, extend_vocabulary, hashtag_vocabulary,
+                         node_ids, node_names)
+
+# supported (compressed) edge list formats, pandas infers compression from suffix
+EDGE_FILE_SUFFIXES = [".csv", ".csv.gz", ".csv.zst"]
 
 
 def time_windows() -> list[tuple[int]]:
@@ -32,20 +44,163 @@ def time_windows() -> list[tuple[int]]:
     return result
 
 
-def temporal_network(file: str) -> ig.Graph:
+def edge_file(start: int, stop: int) -> str:
+    """
+    Edge list file of snapshot (plain or compressed csv).
+
+    Parameter:
+    - start: unix start time of snapshot
+    - stop: unix stop time of snapshot
+
+    Return:
+    - path of edge list file
+    """
+
+    f = os.path.join(EDGE_DIR, f"{start}-{stop}")
+    for suffix in EDGE_FILE_SUFFIXES:
+        if os.path.isfile(f + suffix):
+            return f + suffix
+
+    raise FileNotFoundError(f"No edge list found for snapshot {start}-{stop}.")
+
+
+def node_degrees(file: str, chunksize: int = EDGE_CHUNKSIZE) -> tuple[list[str], np.ndarray]:
+    """
+    Streaming computation of node degrees (edges are assumed to be given in both directions).
+    Only one chunk of the edge list and one counter per node are held in memory at a time.
+
+    Parameter:
+    - file: file of stored edge list (csv, optionally gzip/zstd compressed)
+    - chunksize: number of edge list rows per chunk
+
+    Return:
+    - node labels (order of first appearance) and degrees
+    """
+
+    vocabulary = {}
+    degrees = np.zeros(0, dtype=np.int64)
+
+    for chunk in pd.read_csv(file, usecols=["source", "target"], chunksize=chunksize):
+        endpoints = np.column_stack([chunk["source"].to_numpy(), chunk["target"].to_numpy()]).ravel()
+        codes, uniques = pd.factorize(endpoints, use_na_sentinel=False)
+
+        # translate chunk codes into global codes
+        mapping = np.fromiter((vocabulary.setdefault(n, len(vocabulary)) for n in uniques),
+                              dtype=np.int64, count=len(uniques))
+        pairs = mapping[codes].reshape(-1, 2)
+
+        # every row adds one to degree of source (loops count twice)
+        degrees = np.pad(degrees, (0, len(vocabulary) - len(degrees)))
+        degrees += np.bincount(pairs[:, 0], minlength=len(vocabulary))
+        degrees += np.bincount(pairs[pairs[:, 0] == pairs[:, 1], 0], minlength=len(vocabulary))
+
+    return list(vocabulary), degrees
+
+
+def co_occurrences(file: str, chunksize: int = EDGE_CHUNKSIZE,
+                   nodes: list[str] = None) -> tuple[list[str], np.ndarray, np.ndarray]:
+    """
+    Streaming aggregation of edge list into co-occurrence counts per canonical node pair (min, max).
+    Only one chunk of the edge list is held in memory at a time.
+
+    Parameter:
+    - file: file of stored edge list (csv, optionally gzip/zstd compressed)
+    - chunksize: number of edge list rows per chunk
+    - nodes: restrict to co-occurrences among given nodes (integer codes follow given order)
+
+    Return:
+    - node labels (order of first appearance), node pairs (n x 2, integer codes) and number of co-occurrences per pair
+    """
+
+    vocabulary = {n: i for i, n in enumerate(nodes)} if nodes is not None else {}
+    keep = pd.Index(nodes) if nodes is not None else None
+    counts = pd.Series(dtype="int64")  # merged counts per key
+    pending, num_pending = [], 0  # counts per key of chunks not merged yet
+
+    for chunk in pd.read_csv(file, usecols=["source", "target"], chunksize=chunksize):
+        if nodes is not None:
+            chunk = chunk[chunk["source"].isin(keep) & chunk["target"].isin(keep)]
+
+        endpoints = np.column_stack([chunk["source"].to_numpy(), chunk["target"].to_numpy()]).ravel()
+        codes, uniques = pd.factorize(endpoints, use_na_sentinel=False)
+
+        # translate chunk codes into global codes
+        mapping = np.fromiter((vocabulary.setdefault(n, len(vocabulary)) for n in uniques),
+                              dtype=np.int64, count=len(uniques))
+        pairs = mapping[codes].reshape(-1, 2)
+
+        # key: canonical pair (min, max) and direction of row
+        lo = pairs.min(axis=1)
+        hi = pairs.max(axis=1)
+        forward = (pairs[:, 0] <= pairs[:, 1]).astype(np.int64)
+        keys = (((lo << 32) | hi) << 1) | forward
+
+        pending.append(pd.Series(keys).value_counts())
+        num_pending += len(pending[-1])
+
+        # merge once the pending counts outgrow the merged ones (every key is regrouped O(log chunks) times instead of
+        # once per chunk)
+        if num_pending >= len(counts):
+            counts = pd.concat([counts] + pending).groupby(level=0).sum()
+            pending, num_pending = [], 0
+
+    counts = pd.concat([counts] + pending).groupby(level=0).sum()
+    keys = counts.index.to_numpy(dtype=np.int64)
+    pair_keys = keys >> 1
+    forward = (keys & 1) == 1
+
+    # "mutual": pair of directed edges is combined to undirected one (loops are mutual by themselves)
+    pair_counts = pd.DataFrame({
+        "forward": pd.Series(counts.to_numpy()[forward], index=pair_keys[forward]),
+        "backward": pd.Series(counts.to_numpy()[~forward], index=pair_keys[~forward]),
+    }).fillna(0).astype("int64").sort_index()
+
+    pair_keys = pair_counts.index.to_numpy(dtype=np.int64)
+    pairs = np.column_stack([pair_keys >> 32, pair_keys & 0xFFFFFFFF])
+    weights = np.where(pairs[:, 0] == pairs[:, 1], pair_counts["forward"].to_numpy(),
+                       np.minimum(pair_counts["forward"].to_numpy(), pair_counts["backward"].to_numpy()))
+
+    return list(vocabulary), pairs[weights > 0], weights[weights > 0]
+
+
+def temporal_network(file: str, engine: str = "columnar") -> ig.Graph:
     """
     Converting edge list into undirected co-occurrence network.
 
     Parameter:
-    - file: file of stored edge list
+    - file: file of stored edge list (csv, optionally gzip/zstd compressed)
+    - engine: ingest engine (tuples, columnar or aggregated)
 
     Return:
     - igraph network/graph instance
+      (aggregated: one edge per node pair, co-occurrence count as edge weight instead of timestamp)
     """
 
+    assert engine in ["tuples", "columnar", "aggregated"]
+
+    if engine == "aggregated":
+        names, pairs, weights = co_occurrences(file)
+
+        g = ig.Graph(n=len(names), edges=pairs, directed=False)
+        g.vs["name"] = names
+        g.es["weight"] = weights.tolist()
+
+        return g
+
     df = pd.read_csv(file)
-    g = ig.Graph.TupleList(df.itertuples(index=False), directed=True,
-                           vertex_name_attr="name", edge_attrs=["timestamp"])
+
+    if engine == "tuples":
+        g = ig.Graph.TupleList(df.itertuples(index=False), directed=True,
+                               vertex_name_attr="name", edge_attrs=["timestamp"])
+    else:
+        # interleave source and target so that integer codes follow the order of first appearance
+        # (same vertex ids as TupleList)
+        endpoints = np.column_stack([df["source"].to_numpy(), df["target"].to_numpy()]).ravel()
+        codes, names = pd.factorize(endpoints, use_na_sentinel=False)
+
+        g = ig.Graph(n=len(names), edges=codes.reshape(-1, 2), directed=True)
+        g.vs["name"] = names.tolist()
+        g.es["timestamp"] = df["timestamp"].tolist()
 
     # convert to undirected network
     # "mutual" means that pair of directed edges is combined to undirected one
@@ -54,6 +209,33 @@ def temporal_network(file: str) -> ig.Graph:
     return g
 
 
+def pruned_network(file: str, figure: str) -> ig.Graph:
+    """
+    Two-pass conversion of edge list into weighted, undirected co-occurrence network
+    without "unimportant" nodes (degree below median of fitted degree distribution).
+    First pass computes node degrees, second pass only materializes remaining nodes and their edges.
+
+    Parameter:
+    - file: file of stored edge list (csv, optionally gzip/zstd compressed)
+    - figure: file to store plot of degree distribution
+
+    Return:
+    - igraph network/graph instance (co-occurrence count as edge weight, median as graph attribute)
+    """
+
+    names, degrees = node_degrees(file)
+    median = degree_distro(degrees=degrees.tolist(), file=figure)
+
+    names, pairs, weights = co_occurrences(file, nodes=[n for n, d in zip(names, degrees) if d >= median])
+
+    g = ig.Graph(n=len(names), edges=pairs, directed=False)
+    g.vs["name"] = names
+    g.es["weight"] = weights.tolist()
+    g["median"] = median
+
+    return g
+
+
 def tweets_in_time_window(start: int, stop: int) -> int:
     """
     Number of tweets for a given time window (snapshot).
@@ -66,28 +248,173 @@ def tweets_in_time_window(start: int, stop: int) -> int:
     - number of tweets
     """
 
+    snapshot_id = _indexed_snapshot(start, stop)
+    if snapshot_id is not None:
+        count = occurrence_index().tweets[snapshot_id]
+        if count < 0:
+            raise IndexError(f"Number of tweets missing for snapshot {start}-{stop}.")
+        return int(count)
+
     df = pd.read_csv(os.path.join(DATA_DIR, "tweets.csv"))
     count = df.query(f"start == {start} and stop == {stop}").values[0][-1]
 
     return count
 
 
-def get_node_occurrences(start: int, stop: int, nodes: list[str]) -> list[int]:
+def get_node_occurrences(start: int, stop: int, nodes: list[str], ids: np.ndarray = None) -> list[int]:
     """
     Cumulative node occurrence count for given time window.
 
     Parameter:
     - start: unix start time of snapshot
     - stop: unix stop time of snapshot
-    - nodes: list of nodes (labels)
+    - nodes: list of nodes (labels, None: resolved from ids)
+    - ids: ids of nodes in vocabulary (looked up from labels if not given)
 
     Return:
     - list of occurrence counts
     """
 
+    snapshot_id = _indexed_snapshot(start, stop)
+    if snapshot_id is not None:
+        # gather from snapshot column of occurrence matrix
+        index = occurrence_index()
+        ids = node_ids(nodes) if ids is None else np.asarray(ids)
+        column = slice(index.occurrences.indptr[snapshot_id], index.occurrences.indptr[snapshot_id + 1])
+        rows = index.occurrences.indices[column]
+        positions = np.minimum(np.searchsorted(rows, ids), max(len(rows) - 1, 0))
+        found = rows[positions] == ids if len(rows) else np.zeros(len(ids), dtype=bool)
+        if not found.all():
+            missing = [n for n, _ in zip(nodes if nodes is not None else ids, found) if not _][:10]
+            raise KeyError(f"No occurrences of {missing} in snapshot {start}-{stop}.")
+        return index.occurrences.data[column][positions].tolist()
+
     f = os.path.join(NODE_DIR, f"{start}-{stop}.csv")
     df = pd.read_csv(f, index_col=0)
 
-    result = [df.loc[n]["count"] for n in nodes]
+    result = [df.loc[n]["count"] for n in (node_names(ids) if nodes is None else nodes)]
 
     return result
+
+
+class OccurrenceIndex(NamedTuple):
+    vocabulary: Vocabulary  # hashtags (utf-8 encoded, position = id, append-only)
+    occurrences: sp.csc_matrix  # hashtag x snapshot occurrence counts
+    tweets: np.ndarray  # number of tweets per snapshot (-1: unknown)
+    windows: np.ndarray  # time windows of snapshots (start, stop)
+
+
+def build_occurrence_index(incremental: bool = False):
+    """
+    Index node occurrences of all snapshots: vocabulary of hashtags, sparse hashtag x snapshot count matrix
+    and number of tweets per snapshot. Stored as .npy files (memory-mappable) in INDEX_DIR.
+    The vocabulary of an existing index is extended, i.e. hashtags keep their ids and stored artifacts stay valid.
+
+    Parameter:
+    - incremental: only index snapshots not in the index yet (their columns are appended)
+    """
+
+    windows = np.array(time_windows(), dtype=np.int64).reshape(-1, 2)
+
+    num_indexed = 0
+    if incremental and os.path.isfile(os.path.join(INDEX_DIR, "windows.npy")):
+        index = occurrence_index()
+        num_indexed = len(index.windows)
+        assert np.array_equal(index.windows, windows[:num_indexed]), \
+            "Snapshots can only be appended in incremental mode."
+        if num_indexed == len(windows):
+            return
+
+    frames = []
+    for snapshot_id, (start, stop) in enumerate(windows[num_indexed:]):
+        f = os.path.join(NODE_DIR, f"{start}-{stop}.csv")
+        if os.path.isfile(f):
+            df = pd.read_csv(f, dtype={"node": str})
+            frames.append(pd.DataFrame({"node": df["node"], "snapshot": snapshot_id, "count": df["count"]}))
+    df = pd.concat(frames, ignore_index=True)
+
+    # vocabulary: hashtags of existing vocabulary keep their ids, new hashtags are appended
+    codes, uniques = pd.factorize(df["node"])
+    ids = extend_vocabulary(uniques.tolist())[codes]
+    num_hashtags = len(hashtag_vocabulary().order)
+
+    occurrences = sp.csc_matrix((df["count"].to_numpy(dtype=np.int64), (ids, df["snapshot"].to_numpy())),
+                                shape=(num_hashtags, len(windows) - num_indexed))
+    occurrences.sort_indices()
+
+    tweets = np.full(len(windows) - num_indexed, -1, dtype=np.int64)
+    df = pd.read_csv(os.path.join(DATA_DIR, "tweets.csv"))
+    for snapshot_id, (start, stop) in enumerate(windows[num_indexed:]):
+        count = df.query(f"start == {start} and stop == {stop}")["count"]
+        if len(count):
+            tweets[snapshot_id] = count.values[0]
+
+    # columns of indexed snapshots (rows of new hashtags are empty)
+    if num_indexed:
+        indexed = sp.csc_matrix((index.occurrences.data, index.occurrences.indices, index.occurrences.indptr),
+                                shape=(num_hashtags, num_indexed))
+        occurrences = sp.hstack([indexed, occurrences], format="csc")
+        tweets = np.concatenate([index.tweets, tweets])
+
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    for name, array in [("indptr", occurrences.indptr), ("indices", occurrences.indices),
+                        ("occurrences", occurrences.data), ("tweets", tweets), ("windows", windows)]:
+        with atomic_open(os.path.join(INDEX_DIR, f"{name}.npy"), "wb") as fp:
+            np.save(fp, array)
+
+    occurrence_index.cache_clear()
+
+
+@lru_cache(maxsize=1)
+def occurrence_index() -> OccurrenceIndex:
+    """
+    Load (memory-mapped) occurrence index (see build_occurrence_index).
+
+    Return:
+    - occurrence index
+    """
+
+    def load(name: str) -> np.ndarray:
+        return np.load(os.path.join(INDEX_DIR, f"{name}.npy"), mmap_mode="r")
+
+    windows = load("windows")
+    occurrences = sp.csc_matrix((load("occurrences"), load("indices"), load("indptr")),
+                                shape=(len(hashtag_vocabulary().order), len(windows)), copy=False)
+
+    return OccurrenceIndex(vocabulary=hashtag_vocabulary(), occurrences=occurrences, tweets=load("tweets"),
+                           windows=windows)
+
+
+def _indexed_snapshot(start: int, stop: int) -> int:
+    """
+    Id of snapshot in occurrence index.
+
+    Parameter:
+    - start: unix start time of snapshot
+    - stop: unix stop time of snapshot
+
+    Return:
+    - snapshot id (None if no index exists or snapshot is not indexed)
+    """
+
+    if not os.path.isfile(os.path.join(INDEX_DIR, "windows.npy")):
+        return None
+
+    windows = occurrence_index().windows
+    matches = np.flatnonzero((windows[:, 0] == start) & (windows[:, 1] == stop))
+
+    return int(matches[0]) if len(matches) else None
+
+
+def node_time_series(node: str) -> list[int]:
+    """
+    Occurrence counts of node for all indexed snapshots.
+
+    Parameter:
+    - node: node label
+
+    Return:
+    - list of occurrence counts (ordered by snapshot)
+    """
+
+    return occurrence_index().occurrences[node_ids([node])[0]].toarray().ravel().tolist()
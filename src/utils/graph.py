@@ -1,13 +1,105 @@
+import hashlib
+import json
 import logging
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 import igraph as ig
 import matplotlib.pyplot as plt
+import numpy as np
 import powerlaw as pl
+from scipy.special import erfc, zeta
 
+from .config import (ADAPTIVE_RESTARTS, DEGREE_FIT, LEIDEN_RESOLUTION,
+                     RESTART_EPSILON, RESTART_PATIENCE, RESTART_WORKERS)
 from .model import Edge, EdgeType, Network, Node, NodeType
+from .vocabulary import node_names
 
+_restart_graph: ig.Graph = None
 
-def detect_communities(g: ig.Graph, method: str, membership: bool = True, initial_membership: list[int] = []):
+PAGERANK_CACHE_SIZE = 8  # networks whose PageRank values are cached (see pagerank)
+CENTRALITY_DECIMALS = 12  # centralities are rounded before selecting the most central nodes (numerical noise)
+_pagerank_cache: dict[bytes, np.ndarray] = {}
+
+
+def _init_restart_worker(g: ig.Graph):
+    """
+    Keep graph in worker process (transferred once per worker instead of once per restart).
+
+    Parameter:
+    - g: igraph graph instance
+    """
+
+    global _restart_graph
+    _restart_graph = g
+
+
+def _canonical_membership(membership: list[int]) -> list[int]:
+    """
+    Relabel communities in order of first appearance (independent of community ids).
+
+    Parameter:
+    - membership: membership vector
+
+    Return:
+    - relabeled membership vector
+    """
+
+    labels = {}
+    return [labels.setdefault(c, len(labels)) for c in membership]
+
+
+def _community_run(method: str, seed: int, initial_membership: list[int] = [], adaptive: bool = False,
+                   resolution: float = 1, g: ig.Graph = None) -> tuple[list[int], float, int]:
+    """
+    Single seeded community detection run.
+
+    Parameter:
+    - method: community algorithm (leiden or infomap)
+    - seed: seed of random number generator
+    - initial_membership: provide initial membership vector (Leiden is iterated until convergence from it)
+    - adaptive: iterate Leiden until partition does not change anymore (instead of fixed number of iterations)
+    - resolution: resolution parameter of Leiden
+    - g: igraph graph instance (default: graph of worker process)
+
+    Return:
+    - membership vector, modularity and number of iterations
+    """
+
+    g = g if g is not None else _restart_graph
+    random.seed(seed)
+
+    # apply community detection
+    if method == "infomap":
+        communities = g.community_infomap(edge_weights="weight", trials=10)
+        iterations = 10
+    elif method == "leiden" and not adaptive and not initial_membership:
+        communities = g.community_leiden(
+            objective_function="modularity", weights="weight", resolution_parameter=resolution, n_iterations=1000,
+            node_weights=None, initial_membership=(initial_membership if initial_membership else None))
+        iterations = 1000
+    elif method == "leiden":
+        partition = _canonical_membership(initial_membership) if initial_membership else None
+        for iterations in range(1, 1001):
+            communities = g.community_leiden(
+                objective_function="modularity", weights="weight", resolution_parameter=resolution, n_iterations=1,
+                node_weights=None, initial_membership=partition)
+
+            # stable iteration (a warm start from a converged partition stops after the first iteration)
+            if _canonical_membership(communities.membership) == partition:
+                break
+            partition = _canonical_membership(communities.membership)
+
+    return communities.membership, g.modularity(membership=communities, resolution=resolution), iterations
+
+
+def detect_communities(g: ig.Graph, method: str, membership: bool = True, initial_membership: list[int] = [],
+                       restarts: int = 10, workers: int = RESTART_WORKERS, seed: int = None,
+                       adaptive: bool = ADAPTIVE_RESTARTS, patience: int = RESTART_PATIENCE,
+                       epsilon: float = RESTART_EPSILON, resolution: float = LEIDEN_RESOLUTION, stats: dict = None):
     """
     Community detection.
 
@@ -15,7 +107,16 @@ def detect_communities(g: ig.Graph, method: str, membership: bool = True, initia
     - g: igraph graph instance
     - method: community algorithm (leiden or infomap)
     - membership: return membership vector?
-    - initial_membership: provide initial membership vector
+    - initial_membership: provide initial membership vector (warm start: Leiden runs until convergence, otherwise
+      a fixed number of iterations would be spent from the initial partition)
+    - restarts: (maximum) number of runs (best modularity is kept)
+    - workers: number of worker processes running restarts in parallel
+    - seed: seed of restart seeds (default: drawn from random module, i.e. reproducible via random.seed)
+    - adaptive: iterate Leiden until convergence and stop restarts early
+    - patience: (adaptive) stop after this many consecutive runs without improvement
+    - epsilon: (adaptive) minimum modularity gain counted as improvement
+    - resolution: resolution parameter of Leiden
+    - stats: dict filled with number of restarts/iterations used and best modularity
 
     Return:
     - either membership vector or igraph network clustering
@@ -23,28 +124,50 @@ def detect_communities(g: ig.Graph, method: str, membership: bool = True, initia
 
     assert method in ["infomap", "leiden"]
 
-    # 10 runs with best modularity
+    if method == "infomap" and initial_membership:
+        raise Exception("Initial membership not allowed with Infomap.")
+    if method == "leiden":
+        assert not g.is_directed(), "graph has to be undirected"
+
+    # every run gets its own seed, best run does not depend on number of workers
+    rng = random.Random(seed) if seed is not None else random
+    seeds = [rng.randrange(2**31) for _ in range(restarts)]
+
+    def runs():
+        # runs in order of seeds, computed in batches of workers (not more than needed when stopping early)
+        if workers <= 1:
+            for s in seeds:
+                yield _community_run(method, s, initial_membership, adaptive, resolution, g)
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, restarts), initializer=_init_restart_worker,
+                                     initargs=(g,)) as executor:
+                for i in range(0, restarts, workers):
+                    yield from executor.map(_community_run, repeat(method), seeds[i:i + workers],
+                                            repeat(initial_membership), repeat(adaptive), repeat(resolution))
+
+    # run with best modularity
     best_modularity = 0
     best_clustering: ig.VertexClustering
+    num_restarts, num_iterations, num_stale = 0, 0, 0
 
-    for _ in range(10):
-        # apply community detection
-        if method == "infomap":
-            if initial_membership:
-                raise Exception("Initial membership not allowed with Infomap.")
-            communities = g.community_infomap(edge_weights="weight", trials=10)
-        elif method == "leiden":
-            assert not g.is_directed(), "graph has to be undirected"
-            communities = g.community_leiden(
-                objective_function="modularity", weights="weight", resolution_parameter=1, n_iterations=1000,
-                node_weights=None, initial_membership=(initial_membership if initial_membership else None))
-
-        mod = g.modularity(membership=communities)
+    for communities, mod, iterations in runs():
         logging.info(f"Best modularity: {best_modularity} - Current modularity: {mod}")
+        num_restarts += 1
+        num_iterations += iterations
+        num_stale = 0 if mod > best_modularity + epsilon else num_stale + 1
 
         if mod > best_modularity:
             best_modularity = mod
-            best_clustering = communities
+            best_clustering = ig.VertexClustering(g, communities)
+
+        if adaptive and num_stale >= patience:
+            break
+
+    logging.info(f"Community detection ({method}): {num_restarts} restarts, {num_iterations} iterations "
+                 f"-> modularity: {best_modularity}")
+
+    if stats is not None:
+        stats.update(restarts=num_restarts, iterations=num_iterations, modularity=best_modularity)
 
     if membership:
         return best_clustering.membership
@@ -52,16 +175,160 @@ def detect_communities(g: ig.Graph, method: str, membership: bool = True, initia
         return best_clustering
 
 
-def degree_distro(degrees: list[int], file: str) -> float:
+def node_key(g: ig.Graph) -> str:
+    """
+    Node attribute identifying nodes across networks: id in hashtag vocabulary if available, otherwise name.
+
+    Parameter:
+    - g: igraph graph instance
+
+    Return:
+    - name of node attribute
+    """
+
+    return "id" if "id" in g.vs.attributes() else "name"
+
+
+def node_labels(g: ig.Graph) -> list[str]:
+    """
+    Node labels (resolved from hashtag vocabulary for networks with node ids only).
+
+    Parameter:
+    - g: igraph graph instance
+
+    Return:
+    - list of node labels
     """
-    Fitting and plotting of degree distribution:
+
+    return g.vs["name"] if "name" in g.vs.attributes() else node_names(g.vs["id"])
+
+
+def warm_start_membership(g: ig.Graph, previous: dict) -> list[int]:
+    """
+    Initial membership vector from partition of another network (e.g. previous snapshot).
+    Nodes are matched by id (or name, see node_key), unknown nodes start as singleton communities.
+
+    Parameter:
+    - g: igraph graph instance
+    - previous: community per node id (or name)
+
+    Return:
+    - membership vector
+    """
+
+    singletons = max(previous.values(), default=-1) + 1
+    membership = []
+    for node in g.vs[node_key(g)]:
+        if node in previous:
+            membership.append(previous[node])
+        else:
+            membership.append(singletons)
+            singletons += 1
+
+    return _canonical_membership(membership)
+
+
+def pmi(g: ig.Graph, total: int, variant: str = "pmi") -> list[float]:
+    """
+    PMI (point-wise mutual information) of all edges, computed on whole arrays.
+    PMI(node_1; node_2) = log(p(co-occurrence node_1 and node_2)/(p(occurrence node_1) * p(occurrence node_2)))
+    (probability -> frequency)
+
+    Parameter:
+    - g: igraph graph instance (occurrences as node weights, co-occurrences as edge weights)
+    - total: total number of observations (e.g. tweets)
+    - variant: pmi, npmi (normalized to [-1, 1]) or ppmi (positive, negative values set to 0)
+
+    Return:
+    - list of edge weights
+    """
+
+    assert variant in ["pmi", "npmi", "ppmi"]
+
+    edges = np.array(g.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+    node_weights = np.array(g.vs["weight"], dtype=np.float64)
+
+    p1 = node_weights[edges[:, 0]] / total
+    p2 = node_weights[edges[:, 1]] / total
+    p12 = np.array(g.es["weight"], dtype=np.float64) / total
+
+    # math.log instead of np.log: SIMD implementations of np.log may differ in the last bit
+    def log(x: np.ndarray) -> np.ndarray:
+        return np.fromiter(map(math.log, x.tolist()), dtype=np.float64, count=len(x))
+
+    result = log(p12 / (p1 * p2))
+
+    if variant == "npmi":
+        result = result / -log(p12)
+    elif variant == "ppmi":
+        result = np.maximum(result, 0)
+
+    return result.tolist()
+
+
+def degree_histogram(degrees: list[int]) -> dict:
+    """
+    Histogram of node degrees.
 
     Parameter:
     - degrees: list of node degrees
-    - file: file to store plot
 
     Return:
-    - median of distribution
+    - dictionary of (positive) degrees and number of nodes per degree
+    """
+
+    degree, count = np.unique(np.asarray(degrees, dtype=np.int64), return_counts=True)
+
+    return {"degree": degree[degree > 0].tolist(), "count": count[degree > 0].tolist()}
+
+
+def fit_degree_histogram(histogram: dict, xmin: int = 1) -> dict:
+    """
+    Fit of discrete power law (same estimate as powerlaw package) and comparison with discrete exponential
+    distribution (maximum likelihood) from degree histogram instead of list of node degrees.
+
+    Parameter:
+    - histogram: degree histogram (see degree_histogram)
+    - xmin: minimum degree of fit
+
+    Return:
+    - dictionary of exponent alpha, xmin, median, normalized log likelihood ratio R (power law vs. exponential) and
+      its significance p
+    """
+
+    degree = np.array(histogram["degree"], dtype=float)
+    count = np.array(histogram["count"], dtype=float)
+    count, degree = count[degree >= xmin], degree[degree >= xmin]
+    n = count.sum()
+
+    # power law
+    alpha = 1 + n / np.sum(count * np.log(degree / (xmin - .5)))
+    loglikelihoods_power_law = -alpha * np.log(degree) - np.log(zeta(alpha, xmin))
+
+    # exponential (geometric distribution)
+    excess = np.sum(count * (degree - xmin))
+    decay = np.log(1 + n / excess) if excess > 0 else np.inf
+    loglikelihoods_exponential = np.log(-np.expm1(-decay)) - decay * (degree - xmin)
+
+    # normalized log likelihood ratio
+    diff = loglikelihoods_power_law - loglikelihoods_exponential
+    R = np.sum(count * diff)
+    variance = np.sum(count * (diff - R / n)**2) / n
+    p = erfc(abs(R) / np.sqrt(2 * n * variance))
+
+    return {"alpha": float(alpha), "xmin": xmin, "median": float(2**(1 / (alpha - 1)) * xmin),
+            "R": float(R / np.sqrt(n * variance)), "p": float(p)}
+
+
+def plot_degree_fit(degrees: list[int], alpha: float, median: float, file: str):
+    """
+    Plot degree distribution and power law fit.
+
+    Parameter:
+    - degrees: list of node degrees
+    - alpha: exponent of power law
+    - median: median of power law
+    - file: file to store plot
     """
 
     plt.rcParams["figure.figsize"] = [10, 5]
@@ -73,9 +340,58 @@ def degree_distro(degrees: list[int], file: str) -> float:
     # plot degree density distribution
     pl.plot_pdf(degrees, linestyle="solid", color="black", ax=ax)
 
+    # power law fit
+    power_law = pl.Power_Law(xmin=1, parameters=[alpha], discrete=True)
+    power_law.plot_pdf(data=np.asarray(degrees), ax=ax, linestyle="dashed", color="black",
+                       label=rf"$p(k)=k^{{{-1 * round(alpha, 2)}}}$")
+
+    plt.axvline(x=median, ymin=0.05, ymax=0.95, color="black",
+                linestyle="dotted", label=rf"$k_{{med}} = {round(median, 2)}$")
+
+    ax.set_xscale("log", base=10)
+    ax.set_yscale("log", base=10)
+    ax.set_xlabel(r"$k$")
+    ax.set_ylabel(r"$p(k)$")
+    # ax.set_title("Distribution of Degrees", fontsize=14, weight="bold")
+    ax.set_xlim(1)
+    ax.legend()
+
+    plt.tight_layout()
+    plt.savefig(file)
+    plt.close(fig)
+
+
+def degree_distro(degrees: list[int], file: str) -> float:
+    """
+    Fitting and plotting of degree distribution. Histogram fit (see DEGREE_FIT) stores degree histogram and fit
+    as JSON file instead of plotting (see plot_degree_fit).
+
+    Parameter:
+    - degrees: list of node degrees
+    - file: file to store plot
+
+    Return:
+    - median of distribution
+    """
+
+    if DEGREE_FIT == "histogram":
+        histogram = degree_histogram(degrees)
+        fit = fit_degree_histogram(histogram)
+        print(f"R: {fit['R']}, p: {fit['p']}")
+
+        assert fit["R"] > 0, "Power-law is not a good fit!"
+
+        if fit["alpha"] <= 1:
+            raise Exception("Median of power law cannot be determined.")
+
+        os.makedirs(os.path.dirname(file) or ".", exist_ok=True)
+        with open(os.path.splitext(file)[0] + ".json", "w") as fp:
+            json.dump({"histogram": histogram, "fit": fit}, fp)
+
+        return fit["median"]
+
     # power law fit
     fit = pl.Fit(degrees, xmin=1, discrete=True)
-    fit.power_law.plot_pdf(ax=ax, linestyle="dashed", color="black", label=rf"$p(k)=k^{{{-1 * round(fit.alpha, 2)}}}$")
 
     # check if exponential is better fit
     # see https://journals.plos.org/plosone/article/file?id=10.1371/journal.pone.0085777&type=printable; accessed 06-09-22
@@ -93,44 +409,119 @@ def degree_distro(degrees: list[int], file: str) -> float:
     else:
         raise Exception("Median of power law cannot be determined.")
 
-    plt.axvline(x=median, ymin=0.05, ymax=0.95, color="black",
-                linestyle="dotted", label=rf"$k_{{med}} = {round(median, 2)}$")
+    plot_degree_fit(degrees, alpha=fit.alpha, median=median, file=file)
 
-    ax.set_xscale("log", base=10)
-    ax.set_yscale("log", base=10)
-    ax.set_xlabel(r"$k$")
-    ax.set_ylabel(r"$p(k)$")
-    # ax.set_title("Distribution of Degrees", fontsize=14, weight="bold")
-    ax.set_xlim(1)
-    ax.legend()
+    return median
 
-    plt.tight_layout()
-    plt.savefig(file)
-    plt.close(fig)
 
-    return median
+def pagerank(g: ig.Graph) -> np.ndarray:
+    """
+    PageRank of nodes, computed at most once per network structure: the values of the most recent networks are cached
+    by a hash of their edge list (kept off the network, copies and unions do not carry stale values).
 
+    Parameter:
+    - g: igraph graph instance
+
+    Return:
+    - array of PageRank values
+    """
+
+    edges = np.array(g.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+    key = hashlib.sha256(np.array([g.vcount(), g.is_directed()], dtype=np.int64).tobytes() + edges.tobytes()).digest()
+
+    if key not in _pagerank_cache:
+        if len(_pagerank_cache) >= PAGERANK_CACHE_SIZE:
+            del _pagerank_cache[next(iter(_pagerank_cache))]  # oldest entry
+        _pagerank_cache[key] = np.array(g.pagerank())
+
+    return _pagerank_cache[key].copy()
+
+
+def top_k(values: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of k largest values in linear time (threshold by partition): all values larger than the k-th largest value,
+    remaining slots are filled with values equal to it (lower indices first). The result is sorted by descending value
+    (ties by index).
+
+    Parameter:
+    - values: array of values
+    - k: number of indices
+
+    Return:
+    - array of indices
+    """
+
+    if len(values) == 0 or k <= 0:
+        return np.array([], dtype=np.int64)
+
+    threshold = np.partition(values, max(len(values) - k, 0))[max(len(values) - k, 0)]
+    larger = np.flatnonzero(values > threshold)
+    candidates = np.concatenate([larger, np.flatnonzero(values == threshold)[:k - len(larger)]])
+
+    return candidates[np.lexsort((candidates, -values[candidates]))]
+
+
+def community_pagerank(g: ig.Graph, membership: list[int]) -> np.ndarray:
+    """
+    PageRank of nodes within their communities (same as PageRank of every community subgraph) in one call:
+    PageRank of network without edges between communities (block-diagonal), normalized per community.
+
+    Parameter:
+    - g: igraph graph instance
+    - membership: community membership of nodes
+
+    Return:
+    - array of PageRank values
+    """
+
+    membership = np.asarray(membership)
+    edges = np.array(g.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+    intra = np.flatnonzero(membership[edges[:, 0]] == membership[edges[:, 1]])
+
+    centralities = np.array(g.subgraph_edges(intra.tolist(), delete_vertices=False).pagerank())
+
+    return centralities / np.bincount(membership, weights=centralities)[membership]
+
+
+def grouped_top_k(values: np.ndarray, groups: np.ndarray, k: int) -> list[np.ndarray]:
+    """
+    Indices of k largest values per group in O(n log n) (lexsort). Same selection and order as top_k applied to the
+    values of every group: descending values, ties by index.
+
+    Parameter:
+    - values: array of values
+    - groups: group of values (0, ..., number of groups - 1)
+    - k: number of indices per group
+
+    Return:
+    - list of index arrays (per group)
+    """
+
+    groups = np.asarray(groups)
+    order = np.lexsort((-values, groups))  # stable, ties by index
+    offsets = np.searchsorted(groups[order], np.arange(groups.max(initial=-1) + 2))
 
-def extract_representatives(g: ig.Graph, num: int = 10) -> list[str]:
+    return [order[start:min(start + k, stop)] for start, stop in zip(offsets[:-1], offsets[1:])]
+
+
+def extract_representatives(g: ig.Graph, num: int = 10, attr: str = None) -> list:
     """
     Extract most central nodes.
 
     Parameter:
     - g: igraph graph instance
     - num: number of nodes to extract
+    - attr: node attribute to return (None: node labels)
 
     Return:
-    - list of node labels (ordered by centrality)
+    - list of node labels or attribute values (ordered by centrality)
     """
 
-    centralities = g.pagerank()
-    g.vs["centrality"] = centralities
-    min_centrality = sorted(centralities, reverse=True)[:num][-1]
-    central_nodes = g.vs.select(lambda v: v["centrality"] >= min_centrality)[:num]
-    central_nodes = [n["name"] for n in central_nodes]
-    central_nodes_sorted = sorted(central_nodes, reverse=True, key=lambda _: g.vs.select(name_eq=_)[0]["centrality"])
+    centralities = pagerank(g)
+    g.vs["centrality"] = centralities.tolist()
+    nodes = [g.vs[i][attr or node_key(g)] for i in top_k(np.round(centralities, CENTRALITY_DECIMALS), num)]
 
-    return central_nodes_sorted
+    return node_names(nodes) if attr is None and node_key(g) == "id" else nodes
 
 
 def graph_union(g1: ig.Graph, g2: ig.Graph) -> ig.Graph:
@@ -147,28 +538,106 @@ def graph_union(g1: ig.Graph, g2: ig.Graph) -> ig.Graph:
 
     edges = []
     node_weights = {}
+    key = node_key(g1)
 
     # node weights
     for g in [g1, g2]:
         for v in g.vs:
-            if v["name"] in node_weights:
-                node_weights[v["name"]] = node_weights[v["name"]] + v["weight"]
+            if v[key] in node_weights:
+                node_weights[v[key]] = node_weights[v[key]] + v["weight"]
             else:
-                node_weights[v["name"]] = v["weight"]
+                node_weights[v[key]] = v["weight"]
 
     # temporal edges
     for g in [g1, g2]:
         for e in g.es:
-            n1 = g.vs[e.tuple[0]]["name"]
-            n2 = g.vs[e.tuple[1]]["name"]
+            n1 = g.vs[e.tuple[0]][key]
+            n2 = g.vs[e.tuple[1]][key]
             weight = e["weight"]
             edges.append([n1, n2, weight])
 
-    g_res = ig.Graph.TupleList(edges, directed=False, vertex_name_attr="name", edge_attrs=["weight"])
+    g_res = ig.Graph.TupleList(edges, directed=False, vertex_name_attr=key, edge_attrs=["weight"])
     g_res.simplify(multiple=True, loops=True, combine_edges=dict(weight="sum"))
 
     # add node weights
-    g_res.vs["weight"] = [node_weights[v["name"]] for v in g_res.vs]
+    g_res.vs["weight"] = [node_weights[v[key]] for v in g_res.vs]
+
+    return g_res
+
+
+def graph_union_all(graphs: list[ig.Graph]) -> ig.Graph:
+    """
+    Union of multiple networks, same result as folding graph_union over the networks (node and edge order, summed
+    node and edge weights) but merged at once on integer-coded node arrays.
+
+    Parameter:
+    - graphs: list of networks (in order of folding)
+
+    Return:
+    - union of all networks
+    """
+
+    # folding starts over from the next network whenever the union so far is empty (graph_union drops nodes without
+    # edges, i.e. the union of two networks without edges is empty)
+    start = 0
+    while start < len(graphs):
+        if graphs[start].vcount() == 0:
+            start += 1
+        elif start + 1 < len(graphs) and graphs[start].ecount() == 0 and graphs[start + 1].ecount() == 0:
+            start += 2
+        else:
+            break
+    graphs = graphs[start:]
+
+    if len(graphs) == 0:
+        return ig.Graph()
+
+    if len(graphs) == 1:
+        return graphs[0].copy()
+
+    # integer codes of nodes (shared by all networks, node and edge order only depend on order of appearance)
+    key = node_key(graphs[0])
+    names = [np.array(g.vs[key], dtype=np.int64 if key == "id" else object) for g in graphs]
+    vocabulary, codes = np.unique(np.concatenate(names), return_inverse=True)
+    codes = np.split(codes.ravel(), np.cumsum([len(_) for _ in names])[:-1])
+    edges = [c[np.array(g.get_edgelist(), dtype=np.int64).reshape(-1, 2)] for c, g in zip(codes, graphs)]
+
+    # edge weights summed in order of networks
+    all_edges = np.concatenate(edges)
+    keys = all_edges.min(axis=1) * len(vocabulary) + all_edges.max(axis=1)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    edge_weights = np.zeros(len(unique_keys))
+    np.add.at(edge_weights, inverse.ravel(), np.concatenate([np.array(g.es["weight"], dtype=float) for g in graphs]))
+
+    # node weights summed in order of networks, a node only keeps weights from the point on it is part of an edge
+    # (nodes without edges are dropped when folding, except for nodes of the first network joined with an edge
+    # by the second network)
+    first = np.full(len(vocabulary), len(graphs))  # first network with node as part of an edge
+    for i in reversed(range(len(graphs))):
+        first[edges[i].ravel()] = i
+    all_codes = np.concatenate(codes)
+    counted = first[all_codes] <= np.maximum(np.repeat(np.arange(len(graphs)), [len(_) for _ in codes]), 1)
+    weights = np.concatenate([np.array(g.vs["weight"]) for g in graphs])
+    node_weights = np.zeros(len(vocabulary), dtype=weights.dtype)
+    np.add.at(node_weights, all_codes[counted], weights[counted])
+
+    # node and edge order of folding: nodes ordered by first appearance in edges of union so far, followed by edges of
+    # next network, edges of simplified union sorted by node positions
+    sequence = edges[0]
+    for e in edges[1:]:
+        ids = np.concatenate([sequence.ravel(), e.ravel()])
+        order = ids[np.sort(np.unique(ids, return_index=True)[1])]
+        position = np.empty(len(vocabulary), dtype=np.int64)
+        position[order] = np.arange(len(order))
+        pairs = np.unique(np.sort(position[np.concatenate([sequence, e])], axis=1), axis=0)
+        pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+        sequence = order[pairs]
+
+    g_res = ig.Graph(n=len(order), edges=pairs, directed=False)
+    g_res.vs[key] = vocabulary[order].tolist()
+    g_res.es["weight"] = edge_weights[np.searchsorted(unique_keys, sequence.min(axis=1) * len(vocabulary)
+                                                      + sequence.max(axis=1))].tolist()
+    g_res.vs["weight"] = node_weights[order].tolist()
 
     return g_res
 
@@ -188,20 +657,19 @@ def igraph2trend(g: ig.Graph, trend_score: float) -> Network:
     assert g.is_simple(), "Graph has to be simple."
 
     # normalize centrality
-    centralities = g.pagerank()
-    total_centrality = sum(centralities)
-    normalized_centralities = [c / total_centrality for c in centralities]
-    g.vs["centrality"] = normalized_centralities
+    centralities = pagerank(g)
+    total_centrality = sum(centralities.tolist())
+    normalized_centralities = centralities / total_centrality
+    g.vs["centrality"] = normalized_centralities.tolist()
 
     # subgraph of most central nodes
-    min_centrality = sorted(centralities, reverse=True)[:10][-1]
-    central_nodes = g.vs.select(lambda v: v["centrality"] >= min_centrality)[:10]
-    g_central = g.induced_subgraph(central_nodes)
+    central_nodes = np.sort(top_k(centralities, 10))
+    g_central = g.induced_subgraph(central_nodes.tolist())
 
-    # extract nodes
+    # extract nodes (labels resolved from hashtag vocabulary)
     nodes = []
-    for v in g_central.vs():
-        n = Node(id=v.index, name=v["name"], weight=v["centrality"], typ=NodeType.hashtag)
+    for v, name in zip(g_central.vs(), node_labels(g_central)):
+        n = Node(id=v.index, name=name, weight=v["centrality"], typ=NodeType.hashtag)
         nodes.append(n)
 
     # extract edges
@@ -1,12 +1,217 @@
 # credits: https://github.com/philipplorenz/memory_community_matching/blob/master/matching.py (accessed 24-06-22)
 
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
+import scipy.sparse as sp
 from scipy.optimize import linear_sum_assignment
+from scipy.sparse.csgraph import connected_components
 
 
-def match(timeseries, memory=2, *, memory_weights=None, score_threshold=.1):
+def _incidence_matrices(timeseries):
+    """
+    sparse binary community x member incidence matrix per timestep
+    (members encoded by a vocabulary shared by all timesteps)
+    """
+
+    vocabulary = {}
+    matrices = []
+
+    for communities in timeseries:
+        indices = [vocabulary.setdefault(member, len(vocabulary))
+                   for members in communities.values() for member in members]
+        indptr = np.cumsum([0] + [len(members) for members in communities.values()])
+        matrices.append((np.array(indices, dtype=np.int64), indptr))
+
+    return [sp.csr_matrix((np.ones(len(indices), dtype=np.int64), indices, indptr),
+                          shape=(len(indptr) - 1, len(vocabulary)))
+            for indices, indptr in matrices]
+
+
+def _overlaps(base, communities):
+    """
+    intersection sizes of all (base, other) community pairs with at least
+    one common member (sparse, sorted by base and then other community)
+    """
+
+    intersections = (base @ communities.T).tocsr()
+    intersections.sort_indices()
+
+    return intersections.tocoo()
+
+
+def _intersections(overlaps, rows, cols):
+    """
+    look up intersection sizes of (base, other) community pairs (0 if
+    there is no common member)
+    """
+
+    keys = overlaps.row.astype(np.int64) * overlaps.shape[1] + overlaps.col
+    queries = rows * overlaps.shape[1] + cols
+
+    if not len(keys):
+        return np.zeros(len(queries), dtype=np.int64)
+
+    positions = np.minimum(np.searchsorted(keys, queries), len(keys) - 1)
+
+    return np.where(keys[positions] == queries, overlaps.data[positions], 0)
+
+
+def _ancestors(community, horizon, temporal_communities_dict, cache):
+    """
+    past members of the temporal community of a (timestep, community)
+    tuple back to timestep horizon, following the chain backward in time
+    (memoized, cache is only valid for one horizon)
+    """
+
+    if community not in cache:
+        previous = temporal_communities_dict.get(community)
+
+        if previous is None or previous[0] < horizon:
+            cache[community] = []
+        else:
+            cache[community] = [previous] + _ancestors(previous, horizon, temporal_communities_dict, cache)
+
+    return cache[community]
+
+
+def _minhash_signatures(incidence, num_perm, seed=0, block_size=1 << 22):
+    """
+    minhash signature (num_perm values) per community of every timestep,
+    members are hashed by universal hashing of their vocabulary index
+    (computed for blocks of permutations with at most block_size hashes)
+    """
+
+    prime = (1 << 31) - 1
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, prime, size=(num_perm, 1), dtype=np.int64)
+    b = rng.integers(0, prime, size=(num_perm, 1), dtype=np.int64)
+
+    signatures = []
+    for matrix in incidence:
+        signature = np.full((matrix.shape[0], num_perm), prime, dtype=np.int64)
+        nonempty = np.flatnonzero(np.diff(matrix.indptr))
+        step = max(block_size // max(len(matrix.indices), 1), 1)
+        for start in range(0, num_perm if len(nonempty) else 0, step):
+            block = slice(start, start + step)
+            hashes = (a[block] * matrix.indices[np.newaxis, :] + b[block]) % prime
+            signature[nonempty, block] = np.minimum.reduceat(hashes, matrix.indptr[nonempty], axis=1).T
+        signatures.append(signature)
+
+    return signatures
+
+
+def _lsh_parameters(threshold, num_perm):
+    """
+    number of bands and rows per band (bands * rows <= num_perm) with
+    minimal sum of false positive and false negative probability mass
+    around the jaccard threshold
+    """
+
+    def _area(bands, rows, lower, upper):
+        s = np.linspace(lower, upper, 201)
+        return (upper - lower) * np.mean(1 - (1 - s ** rows) ** bands)
+
+    best, best_error = (num_perm, 1), np.inf
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            false_positive = _area(bands, rows, 0, threshold)
+            false_negative = (1 - threshold) - _area(bands, rows, threshold, 1)
+            if false_positive + false_negative < best_error:
+                best, best_error = (bands, rows), false_positive + false_negative
+
+    return best
+
+
+def _lsh_keys(signatures, bands, rows):
+    """
+    bucket key per community and band (hash of the band of the signature)
+    """
+
+    coefficients = np.random.default_rng(1).integers(1, 1 << 62, size=rows, dtype=np.int64).astype(np.uint64)
+
+    return [np.stack([(signature[:, band * rows:(band + 1) * rows].astype(np.uint64) * coefficients).sum(axis=1)
+                      for band in range(bands)], axis=1)
+            for signature in signatures]
+
+
+def _candidates(base_keys, keys):
+    """
+    (base, other) community pairs that share a bucket in at least one band
+    (sparse binary matrix)
+    """
+
+    candidates = sp.csr_matrix((base_keys.shape[0], keys.shape[0]), dtype=np.int64)
+
+    for band in range(base_keys.shape[1]):
+        _, labels = np.unique(np.concatenate([base_keys[:, band], keys[:, band]]), return_inverse=True)
+        labels = labels.ravel()
+        num_labels = labels.max() + 1 if len(labels) else 0
+        base = sp.csr_matrix((np.ones(base_keys.shape[0], dtype=np.int64),
+                              (np.arange(base_keys.shape[0]), labels[:base_keys.shape[0]])),
+                             shape=(base_keys.shape[0], num_labels))
+        other = sp.csr_matrix((np.ones(keys.shape[0], dtype=np.int64),
+                               (np.arange(keys.shape[0]), labels[base_keys.shape[0]:])),
+                              shape=(keys.shape[0], num_labels))
+        candidates = candidates + base @ other.T
+
+    return candidates
+
+
+def _candidate_overlaps(i, memory, incidence, keys, timeseries, positions, temporal_communities_dict, ancestors):
+    """
+    exact intersection sizes (see _overlaps) of timestep i with all
+    timesteps in memory, only for candidate pairs of lsh buckets. a base
+    community that is a candidate of any member of a temporal community
+    is a candidate of all its members (within memory)
+    """
+
+    timesteps = [i - j for j in range(1, memory + 1) if i - j >= 0]
+    candidates = {t: _candidates(keys[i], keys[t]) for t in timesteps}
+
+    # temporal communities (community with its chain) as one-hot member x group matrix per timestep
+    members = defaultdict(lambda: ([], []))
+    num_groups = 0
+    for t in timesteps:
+        for l, name in enumerate(timeseries[t]):
+            chain = _ancestors((t, name), i - memory, temporal_communities_dict, ancestors)
+            if not chain:
+                continue
+
+            for timestep, c in [(t, l)] + [(timestep, positions[timestep][group]) for timestep, group in chain]:
+                members[timestep][0].append(c)
+                members[timestep][1].append(num_groups)
+            num_groups += 1
+
+    groups = {t: sp.csr_matrix((np.ones(len(members[t][0]), dtype=np.int64), members[t]),
+                               shape=(candidates[t].shape[1], num_groups)) for t in timesteps}
+
+    # extend candidates along chains of temporal communities
+    group_candidates = sum(candidates[t] @ groups[t] for t in timesteps)
+    candidates = {t: candidates[t] + group_candidates @ groups[t].T for t in timesteps}
+
+    overlaps = {}
+    for t in timesteps:
+        shape = (incidence[i].shape[0], incidence[t].shape[0])
+        pairs = candidates[t].tocsr()
+        pairs.sum_duplicates()
+        pairs.sort_indices()
+        pairs = pairs.tocoo()
+        rows, cols = pairs.row.astype(np.int64), pairs.col.astype(np.int64)
+
+        intersection = np.asarray(incidence[i][rows].multiply(incidence[t][cols]).sum(axis=1)).ravel()
+        overlapping = intersection > 0
+
+        # sorted by base and then other community (like _overlaps)
+        overlaps[t] = sp.coo_matrix((intersection[overlapping], (rows[overlapping], cols[overlapping])),
+                                    shape=shape)
+
+    return overlaps
+
+
+def match(timeseries, memory=2, *, memory_weights=None, score_threshold=.1, engine="sets",
+          assignment="dense", workers=1, num_perm=128, start=1, initial=None):
     """
     Matches community detections from single snapshots in a timeseries
     to get temporal communities that stretch over multiple timesteps.
@@ -37,9 +242,34 @@ def match(timeseries, memory=2, *, memory_weights=None, score_threshold=.1):
 
     score_threshold -- memory weighted jaccard indices under the
     threshold will not be included in the matching
+
+    engine -- "sets" compares the member sets of every pair of
+    communities, "sparse" gets all intersection sizes of a timestep from
+    one product of sparse community x member incidence matrices (only
+    overlapping pairs are scored, same result), "minhash" scores only
+    candidate pairs found by locality sensitive hashing of minhash
+    signatures (approximate, pairs of communities whose jaccard index is
+    too low to reach the threshold even with the weights of all memory
+    steps are likely skipped)
+
+    assignment -- "dense" solves the assignment problem on the full cost
+    matrix, "sparse" keeps only overlapping pairs and solves every
+    connected component of the resulting bipartite graph on its own
+    (same optimum; among equally good matchings another one may be
+    chosen)
+
+    workers -- number of processes solving the components of the sparse
+    assignment in parallel
+
+    num_perm -- number of permutations of the minhash signatures
+
+    start -- first timestep to match (earlier timesteps were matched
+    before, only their communities within memory distance are needed)
+
+    initial -- temporal_communities_dict of the timesteps before start
     """
 
-    temporal_communities_dict = {}
+    temporal_communities_dict = dict(initial or {})
     # stores community membership as automorphism on the communities
     # for a (t, i) tuple of timestep t and community number i, it stores
     # the next (t, i) tuple in a chain backward in time, that this
@@ -49,7 +279,17 @@ def match(timeseries, memory=2, *, memory_weights=None, score_threshold=.1):
     if not memory_weights:
         memory_weights = [1 / i for i in range(1, memory + 1)]
 
-    for i in range(1, len(timeseries)):
+    if engine in ("sparse", "minhash"):
+        incidence = _incidence_matrices(timeseries)
+        sizes = [np.diff(matrix.indptr).tolist() for matrix in incidence]
+        positions = [{name: l for l, name in enumerate(communities)} for communities in timeseries]
+
+    if engine == "minhash":
+        # a pair only reaches the threshold if one of its jaccard indices does with all weights summed up
+        bands, rows = _lsh_parameters(score_threshold / sum(memory_weights), num_perm)
+        keys = _lsh_keys(_minhash_signatures(incidence, num_perm), bands, rows)
+
+    for i in range(max(start, 1), len(timeseries)):
 
         # timestep i
         print('step', i)
@@ -61,6 +301,17 @@ def match(timeseries, memory=2, *, memory_weights=None, score_threshold=.1):
         seen = set()    # remember that these comm. were already checked
         timesteps = []  # which timestamps are used for this iteration
 
+        if engine == "sparse":
+            # intersection sizes with communities of all timesteps in memory
+            overlaps = {i - j: _overlaps(incidence[i], incidence[i - j])
+                        for j in range(1, memory + 1) if i - j >= 0}
+            ancestors = {}
+        elif engine == "minhash":
+            # intersection sizes of candidate pairs only
+            ancestors = {}
+            overlaps = _candidate_overlaps(i, memory, incidence, keys, timeseries, positions,
+                                           temporal_communities_dict, ancestors)
+
         for j in range(1, memory + 1):
 
             # compare with timestep i-j
@@ -73,64 +324,70 @@ def match(timeseries, memory=2, *, memory_weights=None, score_threshold=.1):
             communities = timeseries[i - j]
 
             # the negative weighted jaccard indices to use for matching
-            match_costs = np.zeros((len(base_communities),
-                                    len(communities)), dtype=np.float)
+            if engine in ("sparse", "minhash"):
+                match_costs = _sparse_match_costs(i, j, memory, memory_weights, list(communities),
+                                                  temporal_communities_dict, seen, overlaps, sizes, positions,
+                                                  ancestors)
+
+            else:
+                match_costs = np.zeros((len(base_communities),
+                                        len(communities)), dtype=float)
 
-            for k, (b_name, A) in enumerate(base_communities.items()):
+                for k, (b_name, A) in enumerate(base_communities.items()):
 
-                for l, (name, B) in enumerate(communities.items()):
+                    for l, (name, B) in enumerate(communities.items()):
 
-                    if (i - j, name) in seen:
-                        # this community is part of an already detected
-                        # temporal community. its jaccard index (* memory
-                        # weight) was already added to the score of the
-                        # latest community in this temporal community.
-                        continue
+                        if (i - j, name) in seen:
+                            # this community is part of an already detected
+                            # temporal community. its jaccard index (* memory
+                            # weight) was already added to the score of the
+                            # latest community in this temporal community.
+                            continue
 
-                    intersection = len(A & B)
+                        intersection = len(A & B)
 
-                    if intersection:    # at least one member overlaps
+                        if intersection:    # at least one member overlaps
 
-                        jaccard_index = intersection / len(A | B)
-                        score = jaccard_index * memory_weights[j - 1]
+                            jaccard_index = intersection / len(A | B)
+                            score = jaccard_index * memory_weights[j - 1]
 
-                        """
-                        check if this community is part of an already
-                        detected temporal community. if so, add the
-                        scores for past members of the temp. comm. to
-                        this communities' score (within memory range)
-                        """
-                        timestep, group = i - j, name
+                            """
+                            check if this community is part of an already
+                            detected temporal community. if so, add the
+                            scores for past members of the temp. comm. to
+                            this communities' score (within memory range)
+                            """
+                            timestep, group = i - j, name
 
-                        while True:
-                            try:
-                                # look up previous member in temp. comm.
-                                # chain. if none found, this comm. is not
-                                # member of a detected temp. comm.
-                                timestep, group = temporal_communities_dict[(timestep, group)]
-                            except KeyError:
-                                break
+                            while True:
+                                try:
+                                    # look up previous member in temp. comm.
+                                    # chain. if none found, this comm. is not
+                                    # member of a detected temp. comm.
+                                    timestep, group = temporal_communities_dict[(timestep, group)]
+                                except KeyError:
+                                    break
 
-                            if timestep < i - memory:
-                                # stay within memory range
-                                break
+                                if timestep < i - memory:
+                                    # stay within memory range
+                                    break
 
-                            C = timeseries[timestep][group]
-                            intersection = len(A & C)
+                                C = timeseries[timestep][group]
+                                intersection = len(A & C)
 
-                            if intersection:
+                                if intersection:
 
-                                jaccard_index = intersection / len(A | C)
-                                score += jaccard_index * memory_weights[i - timestep - 1]
+                                    jaccard_index = intersection / len(A | C)
+                                    score += jaccard_index * memory_weights[i - timestep - 1]
 
-                            seen.add((timestep, group))
-                            # previously matched comm. don't count
-                            # separately, because they are added to the
-                            # latest temp. comm. member's score.
-                            # don't visit this comm. again
+                                seen.add((timestep, group))
+                                # previously matched comm. don't count
+                                # separately, because they are added to the
+                                # latest temp. comm. member's score.
+                                # don't visit this comm. again
 
-                        match_costs[k][l] = -1 * score
-                        # scipy implementation uses costs (neg. strength)
+                            match_costs[k][l] = -1 * score
+                            # scipy implementation uses costs (neg. strength)
 
             # print(match_costs)
 
@@ -139,21 +396,28 @@ def match(timeseries, memory=2, *, memory_weights=None, score_threshold=.1):
 
         # aggregate results from memory steps
         # print(all_match_costs)
-        match_costs_array = np.hstack(all_match_costs)
+        if assignment == "sparse":
+            match_costs_array = sp.hstack([sp.coo_matrix(_) for _ in all_match_costs]).tocsr()
+        else:
+            match_costs_array = np.hstack([_.toarray() if sp.issparse(_) else _ for _ in all_match_costs])
         base_community_names = list(timeseries[i].keys())
         community_names = []
         for t in timesteps:
             community_names.extend([(t, _) for _ in timeseries[t].keys()])
 
         # match
-        matches = np.dstack(linear_sum_assignment(match_costs_array))[0]
+        if assignment == "sparse":
+            matches, costs = _sparse_assignment(match_costs_array, workers)
+        else:
+            matches = np.dstack(linear_sum_assignment(match_costs_array))[0]
+            costs = match_costs_array[matches[:, 0], matches[:, 1]]
 
         # filter (only matches above threshold)
-        for k, l in matches:
+        for (k, l), cost in zip(matches, costs):
 
             # print(j, k)
 
-            if match_costs_array[k][l] > - score_threshold:
+            if cost > - score_threshold:
                 continue
 
             temporal_communities_dict[(i, base_community_names[k])] \
@@ -162,6 +426,105 @@ def match(timeseries, memory=2, *, memory_weights=None, score_threshold=.1):
     return temporal_communities_dict
 
 
+def _sparse_match_costs(i, j, memory, memory_weights, names,
+                        temporal_communities_dict, seen, overlaps, sizes, positions, ancestors):
+    """
+    match costs of timestep i against timestep i-j (see match) from
+    precomputed intersection sizes, only overlapping pairs are scored.
+    chains of temporal communities are looked up once per community
+    (ancestors: cache of the current timestep) and their contributions
+    are added depth by depth for all pairs at once (same order of
+    additions as following the chain per pair)
+    """
+
+    overlap = overlaps[i - j]
+    eligible = np.array([(i - j, name) not in seen for name in names], dtype=bool)
+    pairs = np.flatnonzero(eligible[overlap.col])
+    rows, cols, intersection = overlap.row[pairs], overlap.col[pairs], overlap.data[pairs]
+
+    base_sizes = np.array(sizes[i], dtype=np.int64)
+    score = intersection / (base_sizes[rows] + np.array(sizes[i - j], dtype=np.int64)[cols] - intersection) \
+        * memory_weights[j - 1]
+
+    # past members of temporal communities (within memory), backward in time
+    chains = {l: _ancestors((i - j, names[l]), i - memory, temporal_communities_dict, ancestors)
+              for l in np.unique(cols).tolist()}
+
+    for depth in range(max(map(len, chains.values()), default=0)):
+        member_timesteps = np.full(len(names), -1, dtype=np.int64)
+        member_positions = np.full(len(names), -1, dtype=np.int64)
+        for l, chain in chains.items():
+            if len(chain) > depth:
+                member_timesteps[l] = chain[depth][0]
+                member_positions[l] = positions[chain[depth][0]][chain[depth][1]]
+
+        for timestep in np.unique(member_timesteps[cols]).tolist():
+            if timestep < 0:
+                continue
+
+            selected = np.flatnonzero(member_timesteps[cols] == timestep)
+            c = member_positions[cols[selected]]
+            intersection = _intersections(overlaps[timestep], rows[selected], c)
+
+            contributing = intersection > 0
+            selected, c, intersection = selected[contributing], c[contributing], intersection[contributing]
+            score[selected] += intersection / (base_sizes[rows[selected]]
+                                               + np.array(sizes[timestep], dtype=np.int64)[c] - intersection) \
+                * memory_weights[i - timestep - 1]
+
+    for chain in chains.values():
+        seen.update(chain)
+
+    return sp.coo_matrix((-1 * score, (rows, cols)), shape=(overlap.shape[0], len(names)))
+
+
+def _sparse_assignment(match_costs, workers=1):
+    """
+    assignment (minimal costs) of sparse cost matrix, solved separately
+    for every connected component of the bipartite graph of non-zero
+    costs. returns matches (row, column) sorted by row and their costs
+    """
+
+    match_costs = match_costs.tocoo()
+    nonzero = match_costs.data != 0
+    rows, cols, data = match_costs.row[nonzero], match_costs.col[nonzero], match_costs.data[nonzero]
+
+    num_rows = match_costs.shape[0]
+    adjacency = sp.coo_matrix((np.ones(len(rows)), (rows, num_rows + cols)), shape=(sum(match_costs.shape),) * 2)
+    _, labels = connected_components(adjacency, directed=False)
+
+    # dense cost matrix per component
+    components = []
+    order = np.argsort(labels[rows], kind="stable")
+    splits = np.flatnonzero(np.diff(labels[rows][order])) + 1
+    for entries in np.split(order, splits) if len(order) else []:
+        component_rows, component_cols = np.unique(rows[entries]), np.unique(cols[entries])
+        costs = np.zeros((len(component_rows), len(component_cols)), dtype=float)
+        costs[np.searchsorted(component_rows, rows[entries]), np.searchsorted(component_cols, cols[entries])] \
+            = data[entries]
+        components.append((component_rows, component_cols, costs))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            solutions = list(executor.map(linear_sum_assignment, [_[2] for _ in components],
+                                          chunksize=max(1, len(components) // (4 * workers))))
+    else:
+        solutions = [linear_sum_assignment(_[2]) for _ in components]
+
+    matches, costs = [], []
+    for (component_rows, component_cols, component_costs), (k, l) in zip(components, solutions):
+        matches.append(np.stack([component_rows[k], component_cols[l]], axis=1))
+        costs.append(component_costs[k, l])
+
+    if not matches:
+        return np.zeros((0, 2), dtype=np.int64), np.zeros(0)
+
+    matches, costs = np.concatenate(matches), np.concatenate(costs)
+    order = np.argsort(matches[:, 0], kind="stable")
+
+    return matches[order], costs[order]
+
+
 def aggregate_temporal_communities(temporal_communities_dict):
     """
     from a chain of recognized links between communities, follow the
@@ -0,0 +1,76 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Iterable
+
+from tqdm import tqdm
+
+from .config import MAX_IN_FLIGHT, NUM_WORKERS
+
+
+def parallel_map(func: Callable, items: Iterable, workers: int = NUM_WORKERS, max_in_flight: int = MAX_IN_FLIGHT,
+                 desc: str = None) -> list[Any]:
+    """
+    Apply function to all items using a pool of worker processes.
+    At most max_in_flight items are submitted at once, failing items do not stop the others.
+
+    Parameter:
+    - func: function to apply (has to be picklable, i.e. defined at module level)
+    - items: function arguments
+    - workers: number of worker processes (1: sequential execution in current process)
+    - max_in_flight: maximum number of submitted but unfinished items
+    - desc: description of progress bar
+
+    Return:
+    - results in order of items
+    """
+
+    items = list(items)
+    results = [None] * len(items)
+    errors = {}
+
+    def report(i: int, error: Exception = None):
+        if error is None:
+            logging.info(f"{desc or func.__name__} | {items[i]}: done")
+        else:
+            errors[i] = error
+            logging.error(f"{desc or func.__name__} | {items[i]}: failed ({error!r})")
+            tqdm.write(f"{items[i]}: failed ({error!r})")
+
+    with tqdm(total=len(items), desc=desc) as progress:
+        if workers <= 1:
+            for i, item in enumerate(items):
+                try:
+                    results[i] = func(item)
+                    report(i)
+                except Exception as e:
+                    report(i, e)
+                progress.update()
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                pending = {}
+                queue = iter(enumerate(items))
+
+                while True:
+                    # keep number of items in flight bounded
+                    for i, item in queue:
+                        pending[executor.submit(func, item)] = i
+                        if len(pending) >= max(max_in_flight, 1):
+                            break
+
+                    if not pending:
+                        break
+
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        i = pending.pop(future)
+                        try:
+                            results[i] = future.result()
+                            report(i)
+                        except Exception as e:
+                            report(i, e)
+                        progress.update()
+
+    if errors:
+        raise Exception(f"{len(errors)} of {len(items)} items failed: {[items[i] for i in sorted(errors)]}")
+
+    return results
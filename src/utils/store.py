@@ -0,0 +1,360 @@
+import json
+import logging
+import os
+import shutil
+from functools import lru_cache
+
+import igraph as ig
+import numpy as np
+
+from .config import COMMUNITY_DIR, GRAPH_FORMAT
+from .vocabulary import node_ids, node_names
+
+GRAPH_SUFFIXES = {"pickle": ".pkl", "columnar": ".graph"}
+
+
+def graph_file(name: str, graph_format: str = GRAPH_FORMAT) -> str:
+    """
+    File of stored network.
+
+    Parameter:
+    - name: file name without suffix
+    - graph_format: pickle or columnar
+
+    Return:
+    - file name
+    """
+
+    return name + GRAPH_SUFFIXES[graph_format]
+
+
+def graph_name(file: str) -> str:
+    """
+    File name of stored network without suffix.
+
+    Parameter:
+    - file: file of stored network (pickle or columnar)
+
+    Return:
+    - file name without suffix
+    """
+
+    for suffix in GRAPH_SUFFIXES.values():
+        if file.endswith(suffix):
+            return file[:-len(suffix)]
+
+    return file
+
+
+def write_graph(g: ig.Graph, name: str, graph_format: str = GRAPH_FORMAT) -> str:
+    """
+    Store network atomically (interrupted runs do not leave partial networks). Columnar format: directory of
+    .npy files (edges, node/edge attributes) which are memory-mapped when loaded; node names are stored as ids of the
+    hashtag vocabulary of the occurrence index (shared by all snapshots) if available.
+
+    Parameter:
+    - g: igraph graph instance
+    - name: file name without suffix
+    - graph_format: pickle or columnar
+
+    Return:
+    - file of stored network
+    """
+
+    file = graph_file(name, graph_format)
+
+    if graph_format == "pickle":
+        g.write_pickle(file + ".tmp")
+        os.replace(file + ".tmp", file)
+        return file
+
+    shutil.rmtree(file + ".tmp", ignore_errors=True)
+    os.makedirs(file + ".tmp")
+
+    meta = {"vcount": g.vcount(), "directed": g.is_directed(), "attributes": {a: g[a] for a in g.attributes()},
+            "vertex_attributes": g.vs.attributes(), "edge_attributes": g.es.attributes()}
+
+    np.save(os.path.join(file + ".tmp", "edges.npy"), np.array(g.get_edgelist(), dtype=np.int32).reshape(-1, 2))
+    for attr in g.vs.attributes():
+        if attr == "name":
+            try:
+                np.save(os.path.join(file + ".tmp", "vertex_id.npy"), node_ids(g.vs[attr]).astype(np.int32))
+                continue
+            except (FileNotFoundError, KeyError):
+                logging.info(f"Node names of {file} not in vocabulary of occurrence index, stored with network.")
+        np.save(os.path.join(file + ".tmp", f"vertex_{attr}.npy"), np.array(g.vs[attr]))
+    for attr in g.es.attributes():
+        np.save(os.path.join(file + ".tmp", f"edge_{attr}.npy"), np.array(g.es[attr]))
+
+    with open(os.path.join(file + ".tmp", "graph.json"), "w") as fp:
+        json.dump(meta, fp, default=(lambda value: value.item()))  # numpy scalars
+
+    shutil.rmtree(file, ignore_errors=True)
+    os.replace(file + ".tmp", file)
+
+    return file
+
+
+class MappedGraph:
+    """
+    Memory-mapped network stored in columnar format (see write_graph). Degrees, weights and node attributes are
+    available without building an igraph instance; worker processes share the mapped pages.
+    """
+
+    def __init__(self, file: str):
+        self._file = file
+        with open(os.path.join(file, "graph.json")) as fp:
+            self._meta = json.load(fp)
+        self.edges = self._load("edges")
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(os.path.join(self._file, f"{name}.npy"), mmap_mode="r")
+
+    def vcount(self) -> int:
+        return self._meta["vcount"]
+
+    def attributes(self) -> dict:
+        return self._meta["attributes"]
+
+    def vertex_attributes(self) -> list[str]:
+        return self._meta["vertex_attributes"]
+
+    def edge_attributes(self) -> list[str]:
+        return self._meta["edge_attributes"]
+
+    def vertex(self, attr: str) -> np.ndarray:
+        """
+        Node attribute (node names resolved from hashtag vocabulary).
+
+        Parameter:
+        - attr: name of attribute
+
+        Return:
+        - array of attribute values
+        """
+
+        if attr == "name" and os.path.isfile(os.path.join(self._file, "vertex_id.npy")):
+            return np.array(node_names(self._load("vertex_id")))
+
+        return self._load(f"vertex_{attr}")
+
+    def edge(self, attr: str) -> np.ndarray:
+        return self._load(f"edge_{attr}")
+
+    def degree(self) -> np.ndarray:
+        return np.bincount(self.edges.ravel(), minlength=self.vcount())
+
+    def strength(self, weights: str) -> np.ndarray:
+        return np.bincount(self.edges.ravel(), weights=np.repeat(self.edge(weights), 2), minlength=self.vcount())
+
+    def to_igraph(self, vertices: np.ndarray = None) -> ig.Graph:
+        """
+        Build igraph instance, optionally induced by subset of nodes (same as deleting all other nodes).
+        Node names stored as ids of the hashtag vocabulary are kept as node attribute "id" (not resolved).
+
+        Parameter:
+        - vertices: ascending ids of nodes to keep (None: all nodes)
+
+        Return:
+        - igraph network/graph instance
+        """
+
+        edges, eids, n = np.asarray(self.edges), slice(None), self.vcount()
+        if vertices is not None:
+            keep = np.zeros(self.vcount(), dtype=bool)
+            keep[vertices] = True
+            eids = np.flatnonzero(keep[edges[:, 0]] & keep[edges[:, 1]])
+            edges, n = np.searchsorted(vertices, edges[eids]), len(vertices)
+        else:
+            vertices = slice(None)
+
+        g = ig.Graph(n=n, edges=edges, directed=self._meta["directed"])
+        for attr, value in self.attributes().items():
+            g[attr] = value
+        for attr in self.vertex_attributes():
+            if attr == "name" and os.path.isfile(os.path.join(self._file, "vertex_id.npy")):
+                g.vs["id"] = self._load("vertex_id")[vertices].tolist()
+            else:
+                g.vs[attr] = self.vertex(attr)[vertices].tolist()
+        for attr in self.edge_attributes():
+            g.es[attr] = self.edge(attr)[eids].tolist()
+
+        return g
+
+
+def read_graph(file: str) -> ig.Graph:
+    """
+    Load stored network (pickle or columnar, see write_graph).
+
+    Parameter:
+    - file: file of stored network
+
+    Return:
+    - igraph network/graph instance
+    """
+
+    if file.endswith(GRAPH_SUFFIXES["columnar"]):
+        return MappedGraph(file).to_igraph()
+
+    return ig.Graph.Read_Pickle(file)
+
+
+def write_community_store(g: ig.Graph, file: str):
+    """
+    Store all communities of a snapshot network in a single file: membership vector, nodes grouped by community
+    (CSR-style offsets), node attributes as well as edges within communities (grouped by community) and their attributes.
+
+    Parameter:
+    - g: igraph graph instance (community membership as node attribute "community")
+    - file: file to store communities (.npz)
+    """
+
+    membership = np.array(g.vs["community"], dtype=np.int64)
+    num_communities = membership.max() + 1 if len(membership) else 0
+
+    # nodes grouped by community (ascending node ids within community)
+    order = np.argsort(membership, kind="stable")
+    offsets = np.searchsorted(membership[order], np.arange(num_communities + 1))
+
+    # edges within communities grouped by community, inside a community ordered like igraph's induced subgraph:
+    # by larger and then smaller endpoint (subgraph built from scratch) or by edge id for communities containing more
+    # than half of the nodes (subgraph built by copying the network and deleting nodes)
+    edges = np.array(g.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+    edge_ids = np.flatnonzero(membership[edges[:, 0]] == membership[edges[:, 1]])
+    edge_community = membership[edges[edge_ids, 0]]
+    large = np.diff(offsets) > g.vcount() / 2
+    edge_ids = edge_ids[np.lexsort((
+        np.where(large[edge_community], edge_ids, edges[edge_ids].min(axis=1)),
+        np.where(large[edge_community], 0, edges[edge_ids].max(axis=1)),
+        edge_community))]
+    edge_offsets = np.searchsorted(membership[edges[edge_ids, 0]], np.arange(num_communities + 1))
+
+    arrays = {"membership": membership, "order": order, "offsets": offsets,
+              "edges": edges[edge_ids], "edge_offsets": edge_offsets}
+    for attr in g.vs.attributes():
+        arrays[f"vertex_{attr}"] = np.array(g.vs[attr])
+    for attr in g.es.attributes():
+        arrays[f"edge_{attr}"] = np.array(g.es[attr])[edge_ids]
+
+    # write atomically, interrupted runs do not leave partial stores
+    with open(file + ".tmp", "wb") as fp:
+        np.savez(fp, **arrays)
+    os.replace(file + ".tmp", file)
+
+
+class CommunityStore:
+    """
+    Random access to communities of a snapshot network (see write_community_store).
+    Arrays are read from file on first access.
+    """
+
+    def __init__(self, file: str):
+        self._file = np.load(file)
+        self._arrays = {}
+
+    def _get(self, key: str) -> np.ndarray:
+        if key not in self._arrays:
+            self._arrays[key] = self._file[key]
+        return self._arrays[key]
+
+    def __len__(self) -> int:
+        return len(self._get("offsets")) - 1
+
+    def node_ids(self, community_id: int) -> np.ndarray:
+        """
+        Nodes of community.
+
+        Parameter:
+        - community_id: id of community
+
+        Return:
+        - node ids (ascending, ids of snapshot network)
+        """
+
+        offsets = self._get("offsets")
+        return self._get("order")[offsets[community_id]:offsets[community_id + 1]]
+
+    def nodes(self, community_id: int) -> list[str]:
+        """
+        Node labels of community.
+
+        Parameter:
+        - community_id: id of community
+
+        Return:
+        - list of node labels
+        """
+
+        if "vertex_name" in self._file.files:
+            return self._get("vertex_name")[self.node_ids(community_id)].tolist()
+
+        return node_names(self._get("vertex_id")[self.node_ids(community_id)])
+
+    def ids(self, community_id: int) -> list:
+        """
+        Nodes of community as ids of hashtag vocabulary (node labels for stores without ids).
+
+        Parameter:
+        - community_id: id of community
+
+        Return:
+        - list of node ids
+        """
+
+        if "vertex_id" in self._file.files:
+            return self._get("vertex_id")[self.node_ids(community_id)].tolist()
+
+        return self.nodes(community_id)
+
+    def subgraph(self, community_id: int) -> ig.Graph:
+        """
+        Network of community (same as subgraph of community clustering).
+
+        Parameter:
+        - community_id: id of community
+
+        Return:
+        - igraph network/graph instance
+        """
+
+        vids = self.node_ids(community_id)
+        edge_offsets = self._get("edge_offsets")
+        edges = slice(edge_offsets[community_id], edge_offsets[community_id + 1])
+
+        g = ig.Graph(n=len(vids), edges=np.searchsorted(vids, self._get("edges")[edges]), directed=False)
+        for key in self._file.files:
+            if key.startswith("vertex_"):
+                g.vs[key[len("vertex_"):]] = self._get(key)[vids].tolist()
+            elif key.startswith("edge_") and key not in ["edge_offsets", "edges"]:
+                g.es[key[len("edge_"):]] = self._get(key)[edges].tolist()
+
+        return g
+
+
+def community_store_file(time_window: tuple[int]) -> str:
+    """
+    File of community store of snapshot.
+
+    Parameter:
+    - time_window: time window of snapshot as unix time stamp tuple
+
+    Return:
+    - file path
+    """
+
+    return os.path.join(COMMUNITY_DIR, f"{time_window[0]}-{time_window[1]}-com-store.npz")
+
+
+@lru_cache(maxsize=32)
+def community_store(time_window: tuple[int]) -> CommunityStore:
+    """
+    Community store of snapshot.
+
+    Parameter:
+    - time_window: time window of snapshot as unix time stamp tuple
+
+    Return:
+    - community store
+    """
+
+    return CommunityStore(community_store_file(time_window))
@@ -3,9 +3,12 @@ import os
 from datetime import datetime, timezone
 from typing import List
 
+import numpy as np
 from dateutil.relativedelta import relativedelta
 
-from .config import NUM_SNAPSHOTS, NUM_TRENDS, START, TRENDS_DIR
+from .cache import atomic_open
+from .config import (MATCHING_DIR, NUM_SNAPSHOTS, NUM_TRENDS, START,
+                     TRENDS_DIR)
 from .model import TimeWindow, TrendDescription
 
 
@@ -75,3 +78,41 @@ def time_window(snapshot_id: int) -> TimeWindow:
     stop = start + relativedelta(months=1)
 
     return {"start": start, "stop": stop}
+
+
+def write_trend_manifest(matched_communities: List[set], community_scores: List[np.ndarray]):
+    """
+    Store trend scores of all communities and trends as well as the ranking of trends (next to matched communities).
+
+    Parameter:
+    - matched_communities: temporally matched communities (sets of tuples (snapshot, community id))
+    - community_scores: per snapshot, sum of node occurrences per community
+    """
+
+    trend_scores = [sum(community_scores[t][i] for t, i in sorted(trend, key=(lambda _: _[0])))
+                    for trend in matched_communities]
+
+    # sort trend according to overall popularity (same order as sorting (score, trend) tuples)
+    ranking = [i for _, _, i in sorted(zip(trend_scores, matched_communities, range(len(matched_communities))),
+                                       reverse=True)]
+
+    manifest = {
+        "community_scores": [scores.tolist() for scores in community_scores],
+        "trend_scores": [float(score) for score in trend_scores],
+        "ranking": ranking,
+    }
+
+    with atomic_open(os.path.join(MATCHING_DIR, "trend-manifest.json")) as f:
+        json.dump(manifest, f)
+
+
+def trend_manifest() -> dict:
+    """
+    Trend manifest {"community_scores": [[...], ...], "trend_scores": [...], "ranking": [...]}.
+
+    Return:
+    - trend scores of all communities/trends and ranking of trends (indices of matched communities)
+    """
+
+    with open(os.path.join(MATCHING_DIR, "trend-manifest.json")) as f:
+        return json.load(f)
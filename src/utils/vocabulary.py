@@ -0,0 +1,192 @@
+import hashlib
+import os
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+from .cache import atomic_open
+from .config import INDEX_DIR
+
+
+class Vocabulary(NamedTuple):
+    buffer: np.ndarray  # utf-8 encoded hashtags (concatenated bytes)
+    offsets: np.ndarray  # hashtag with id i is buffer[offsets[i]:offsets[i + 1]] (append-only)
+    order: np.ndarray  # ids sorted by hashtag (lookups)
+    prefixes: np.ndarray  # first 8 bytes of hashtags in sorted order (big-endian integers, lookups)
+
+
+@lru_cache(maxsize=1)
+def hashtag_vocabulary() -> Vocabulary:
+    """
+    Hashtag vocabulary of all snapshots (built with the occurrence index): utf-8 encoded hashtags stored as a single
+    byte buffer with offsets, the position of a hashtag is its id. Append-only, i.e. ids never change once assigned
+    (see extend_vocabulary). Memory-mapped, i.e. worker processes share the same pages instead of copies.
+
+    Return:
+    - vocabulary
+    """
+
+    return Vocabulary(*[np.load(os.path.join(INDEX_DIR, f"vocabulary_{name}.npy"), mmap_mode="r")
+                        for name in Vocabulary._fields])
+
+
+@lru_cache(maxsize=1)
+def vocabulary_origin() -> str:
+    """
+    Identifier of the hashtag vocabulary, kept when new hashtags are appended. Ids of artifacts stored with the same
+    origin are valid (a vocabulary built from scratch gets a new origin).
+
+    Return:
+    - hash of the vocabulary when it was first built (None: no vocabulary)
+    """
+
+    if not os.path.isfile(os.path.join(INDEX_DIR, "vocabulary_origin.txt")):
+        return None
+
+    with open(os.path.join(INDEX_DIR, "vocabulary_origin.txt")) as fp:
+        return fp.read()
+
+
+def _prefixes(encoded: list[bytes]) -> np.ndarray:
+    """
+    First 8 bytes of encoded hashtags as integers (padded with NUL bytes), ordered like the hashtags.
+
+    Parameter:
+    - encoded: list of utf-8 encoded hashtags
+
+    Return:
+    - array of prefixes
+    """
+
+    padded = b"".join(e[:8].ljust(8, b"\0") for e in encoded)
+
+    return np.frombuffer(padded, dtype=">u8").astype(np.uint64)
+
+
+def _search(vocabulary: Vocabulary, encoded: list[bytes]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Binary search of encoded hashtags in the sorted order of the vocabulary. Prefixes are searched vectorized, full
+    hashtags are only compared for prefixes shared by several hashtags or hashtags longer than 8 bytes.
+
+    Parameter:
+    - vocabulary: hashtag vocabulary
+    - encoded: list of utf-8 encoded hashtags
+
+    Return:
+    - positions of hashtags in sorted order (insertion positions of unknown hashtags)
+    - mask of hashtags in vocabulary
+    """
+
+    prefixes = _prefixes(encoded)
+    lo = np.searchsorted(vocabulary.prefixes, prefixes, side="left")
+    hi = np.searchsorted(vocabulary.prefixes, prefixes, side="right")
+    if not len(vocabulary.order):
+        return lo, np.zeros(len(encoded), dtype=bool)
+
+    def hashtag(position: int) -> bytes:
+        i = vocabulary.order[position]
+        return vocabulary.buffer[vocabulary.offsets[i]:vocabulary.offsets[i + 1]].tobytes()
+
+    # unique prefix of hashtag with at most 8 bytes: same hashtag iff same length (hashtags contain no NUL bytes)
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    candidates = vocabulary.order[np.minimum(lo, len(vocabulary.order) - 1)]
+    found = (hi - lo == 1) & (vocabulary.offsets[candidates + 1] - vocabulary.offsets[candidates] == lengths)
+
+    positions = lo.copy()
+    for i in np.flatnonzero((hi > lo) & ((hi - lo > 1) | (lengths > 8))):
+        low, high = lo[i], hi[i]
+        while low < high:
+            middle = (low + high) // 2
+            if hashtag(middle) < encoded[i]:
+                low = middle + 1
+            else:
+                high = middle
+        positions[i] = low
+        found[i] = low < hi[i] and hashtag(low) == encoded[i]
+
+    return positions, found
+
+
+def extend_vocabulary(hashtags: list[str]) -> np.ndarray:
+    """
+    Append unknown hashtags to the vocabulary (sorted, ids of known hashtags are kept). A vocabulary is built from
+    scratch (new origin) if none exists.
+
+    Parameter:
+    - hashtags: list of hashtags
+
+    Return:
+    - array of ids of hashtags
+    """
+
+    origin = vocabulary_origin()
+    vocabulary = hashtag_vocabulary() if origin is not None else \
+        Vocabulary(buffer=np.array([], dtype=np.uint8), offsets=np.zeros(1, dtype=np.int64),
+                   order=np.array([], dtype=np.int64), prefixes=np.array([], dtype=np.uint64))
+
+    encoded = sorted({str(h).encode("utf-8") for h in hashtags})
+    positions, found = _search(vocabulary, encoded)
+    added = [e for e, f in zip(encoded, found) if not f]
+
+    if added or origin is None:
+        ids = np.arange(len(vocabulary.order), len(vocabulary.order) + len(added), dtype=np.int64)
+        lengths = np.fromiter(map(len, added), dtype=np.int64, count=len(added))
+        vocabulary = Vocabulary(
+            buffer=np.concatenate([vocabulary.buffer, np.frombuffer(b"".join(added), dtype=np.uint8)]),
+            offsets=np.concatenate([vocabulary.offsets, vocabulary.offsets[-1] + np.cumsum(lengths)]),
+            order=np.insert(vocabulary.order, positions[~found], ids),
+            prefixes=np.insert(vocabulary.prefixes, positions[~found], _prefixes(added)))
+        if origin is None:
+            origin = hashlib.sha256(vocabulary.buffer.tobytes() + vocabulary.offsets.tobytes()).hexdigest()
+
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        for name, array in vocabulary._asdict().items():
+            with atomic_open(os.path.join(INDEX_DIR, f"vocabulary_{name}.npy"), "wb") as fp:
+                np.save(fp, array)
+        with atomic_open(os.path.join(INDEX_DIR, "vocabulary_origin.txt")) as fp:
+            fp.write(origin)
+
+        hashtag_vocabulary.cache_clear()
+        vocabulary_origin.cache_clear()
+
+    return node_ids(hashtags)
+
+
+def node_ids(nodes: list[str]) -> np.ndarray:
+    """
+    Ids of nodes in vocabulary.
+
+    Parameter:
+    - nodes: list of nodes (labels)
+
+    Return:
+    - array of node ids
+    """
+
+    encoded = [str(n).encode("utf-8") for n in nodes]
+    vocabulary = hashtag_vocabulary()
+    positions, found = _search(vocabulary, encoded)
+
+    if not found.all():
+        raise KeyError(f"Unknown nodes: {[n for n, f in zip(nodes, found) if not f][:10]}")
+
+    return np.asarray(vocabulary.order[positions], dtype=np.int64)
+
+
+def node_names(ids: list[int]) -> list[str]:
+    """
+    Node labels of ids in vocabulary.
+
+    Parameter:
+    - ids: list of node ids
+
+    Return:
+    - list of node labels
+    """
+
+    vocabulary = hashtag_vocabulary()
+    ids = np.asarray(ids, dtype=np.int64)
+
+    return [vocabulary.buffer[start:stop].tobytes().decode("utf-8")
+            for start, stop in zip(vocabulary.offsets[ids].tolist(), vocabulary.offsets[ids + 1].tolist())]